@@ -0,0 +1,196 @@
+import time
+from collections import OrderedDict
+
+from engine import PIECES, LEFT, RIGHT, ROTATE, DROP, stack_landing
+
+# Поиск хода для бота: перебор всех достижимых положений текущей фигуры,
+# оценка поля эвристикой и просмотр на одну фигуру вперед (next_piece).
+# Поле в поиске — только битовые маски строк, цвета не копируются.
+
+def place_rows(rows, masks, x, y):
+    """Новый список строк с зафиксированной фигурой"""
+    rows = list(rows)
+    for i, mask in enumerate(masks):
+        rows[y + i] |= mask << x
+    return rows
+
+def clear_rows(rows, full_row):
+    """Удаление заполненных строк, возвращает (строки, число очищенных линий)"""
+    kept = [mask for mask in rows if mask != full_row]
+    cleared = len(rows) - len(kept)
+    if cleared:
+        kept = [0] * cleared + kept
+    return kept, cleared
+
+def column_heights(rows, width):
+    """Высота каждого столбца в клетках, считая от дна"""
+    heights = [0] * width
+    height = len(rows)
+    remaining = (1 << width) - 1
+    for i, mask in enumerate(rows):
+        found = mask & remaining
+        if found:
+            remaining &= ~found
+            for j in range(width):
+                if found >> j & 1:
+                    heights[j] = height - i
+            if not remaining:
+                break
+    return heights
+
+def count_holes(rows):
+    """Пустые клетки, над которыми в том же столбце есть блок"""
+    holes = 0
+    covered = 0
+    for mask in rows:
+        holes += bin(covered & ~mask).count('1')
+        covered |= mask
+    return holes
+
+def default_heuristic(rows, lines, width):
+    """Классическая линейная оценка: высота, линии, дыры и неровность поверхности"""
+    heights = column_heights(rows, width)
+    bumpiness = sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+    return (-0.510066 * sum(heights) + 0.760666 * lines
+            - 0.35663 * count_holes(rows) - 0.184483 * bumpiness)
+
+def reachable_placements(rows, width, piece_id, rotation, x, y, heights=None):
+    """Все конечные положения фигуры: повороты и сдвиги на текущей строке, затем сброс.
+
+    heights — высоты столбцов (Board.heights), если известны; по ним ищется приземление.
+    Возвращает список (поворот, x, y приземления, действия для движка)."""
+    states = PIECES[piece_id]
+    height = len(rows)
+    full_row = (1 << width) - 1
+
+    def collides(state, x, y):
+        for i, mask in enumerate(state.masks):
+            if x < 0 or (mask << x) > full_row or y + i >= height:
+                return True
+            if y + i >= 0 and rows[y + i] & (mask << x):
+                return True
+        return False
+
+    if collides(states[rotation], x, y):
+        return []
+
+    # Обход в ширину по (поворот, x) на строке появления, путь — последовательность действий
+    paths = {(rotation, x): ()}
+    queue = [(rotation, x)]
+    for rotation, x in queue:
+        path = paths[rotation, x]
+        for key, action in (((rotation, x - 1), LEFT),
+                            ((rotation, x + 1), RIGHT),
+                            (((rotation + 1) % len(states), x), ROTATE)):
+            if key not in paths and not collides(states[key[0]], key[1], y):
+                paths[key] = path + (action,)
+                queue.append(key)
+
+    if heights is None:
+        heights = column_heights(rows, width)
+    placements = []
+    for (rotation, x), path in paths.items():
+        state = states[rotation]
+        landing = stack_landing(heights, height, state, x, y)
+        if landing is None:
+            landing = y
+            while not collides(state, x, landing + 1):
+                landing += 1
+        placements.append((rotation, x, landing, path + (DROP,)))
+    return placements
+
+class TranspositionTable:
+    """Ограниченный LRU-кэш оценок позиций, ключ — строки поля и число очищенных линий"""
+    def __init__(self, capacity=200000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+class AutoPlayer:
+    """Бот: выбирает положение для каждой новой фигуры и отдает действия для Engine.step"""
+    def __init__(self, heuristic=default_heuristic, time_budget=0.02, table_size=200000,
+                 lookahead=True):
+        self.heuristic = heuristic
+        self.time_budget = time_budget  # Лимит времени на выбор одного хода, секунды (None — без лимита)
+        self.lookahead = lookahead  # Учитывать ли следующую фигуру
+        self.table = TranspositionTable(table_size)
+        self.planned_piece = None
+
+    def score_board(self, rows, lines, width):
+        """Оценка итогового поля через таблицу транспозиций.
+
+        Одно и то же поле получается на втором уровне поиска одного хода и на первом
+        уровне следующего, а также при перестановке двух одинаковых фигур."""
+        key = (tuple(rows), lines)
+        value = self.table.get(key)
+        if value is None:
+            value = self.heuristic(rows, lines, width)
+            self.table.put(key, value)
+        return value
+
+    def evaluate(self, rows, width, piece_id, lines=0):
+        """Лучшая оценка поля при следующей фигуре piece_id (она появляется в стартовой позиции).
+
+        lines — линии, уже очищенные предыдущим ходом, они входят в итоговую оценку."""
+        spawn_x = width // 2 - PIECES[piece_id][0].width // 2
+        full_row = (1 << width) - 1
+        value = float('-inf')
+        for rotation, x, y, _ in reachable_placements(rows, width, piece_id, 0, spawn_x, 0):
+            placed, cleared = clear_rows(place_rows(rows, PIECES[piece_id][rotation].masks, x, y),
+                                         full_row)
+            value = max(value, self.score_board(placed, lines + cleared, width))
+        return value
+
+    def search(self, rows, width, piece, next_piece=None, heights=None):
+        """Лучшее положение текущей фигуры: (поворот, x, y, действия) или None"""
+        deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        full_row = (1 << width) - 1
+        candidates = []
+        for rotation, x, y, path in reachable_placements(rows, width, piece['id'], piece['rotation'],
+                                                         piece['x'], piece['y'], heights):
+            placed, lines = clear_rows(place_rows(rows, PIECES[piece['id']][rotation].masks, x, y),
+                                       full_row)
+            candidates.append((self.score_board(placed, lines, width), placed, lines,
+                               (rotation, x, y, path)))
+        if not candidates:
+            return None
+
+        # Сначала самые многообещающие ходы: если время кончится, лучшие уже просмотрены
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        best_value, _, _, best = candidates[0]
+        if next_piece is None:
+            return best
+
+        best_value = float('-inf')
+        for value, placed, lines, placement in candidates:
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            value = self.evaluate(placed, width, next_piece['id'], lines)
+            if value > best_value:
+                best_value, best = value, placement
+        return best
+
+    def act(self, engine):
+        """Действия для новой фигуры движка; для уже спланированной — пустой список"""
+        if engine.game_over or engine.current_piece is self.planned_piece:
+            return []
+        self.planned_piece = engine.current_piece
+        board = engine.board
+        best = self.search(board.masks(), board.width, engine.current_piece,
+                           engine.next_piece if self.lookahead else None, board.heights)
+        return list(best[3]) if best else []
@@ -0,0 +1,153 @@
+import numpy as np
+
+from engine import GRID_WIDTH, GRID_HEIGHT, COLORS, PIECES
+
+# Пакетный симулятор: N полей в одном массиве (N, высота, ширина), все правила
+# из Engine применяются векторно сразу ко всем полям.
+# Один шаг — действие игрока и затем одна строка гравитации.
+
+# Действия для BatchEngine.step
+NOOP = 0
+LEFT = 1
+RIGHT = 2
+DOWN = 3
+ROTATE = 4
+DROP = 5
+
+def build_offsets():
+    """Смещения (строка, столбец) четырех клеток каждой фигуры во всех четырех поворотах"""
+    offsets = np.zeros((len(PIECES), 4, 4, 2), dtype=np.int64)
+    for piece_id, states in enumerate(PIECES):
+        for rotation in range(4):
+            # Повороты дополняются по модулю, чтобы следующий поворот был просто (r + 1) % 4
+            offsets[piece_id, rotation] = states[rotation % len(states)].cells
+    return offsets
+
+OFFSETS = build_offsets()
+SPAWN_WIDTHS = np.array([states[0].width for states in PIECES])
+
+class BatchEngine:
+    """N партий, которые идут синхронно: столкновения, фиксация, линии и очки векторно"""
+    def __init__(self, count, seed=None, width=GRID_WIDTH, height=GRID_HEIGHT):
+        self.count = count
+        self.width = width
+        self.height = height
+        self.rng = np.random.default_rng(seed)
+        # 0 — пустая клетка, иначе индекс цвета в COLORS плюс один
+        self.boards = np.zeros((count, height, width), dtype=np.uint8)
+        self.piece = np.zeros(count, dtype=np.int64)
+        self.rotation = np.zeros(count, dtype=np.int64)
+        self.x = np.zeros(count, dtype=np.int64)
+        self.y = np.zeros(count, dtype=np.int64)
+        self.color = np.zeros(count, dtype=np.int64)
+        self.next_piece = np.zeros(count, dtype=np.int64)
+        self.next_color = np.zeros(count, dtype=np.int64)
+        self.score = np.zeros(count, dtype=np.int64)
+        self.lines_cleared_total = np.zeros(count, dtype=np.int64)
+        self.level = np.ones(count, dtype=np.int64)
+        self.game_over = np.zeros(count, dtype=bool)
+        self.rows = np.arange(count)[:, None]
+        self.reset()
+
+    def draw_pieces(self, count):
+        """Случайные фигуры и цвета для count полей"""
+        return (self.rng.integers(len(PIECES), size=count),
+                self.rng.integers(len(COLORS), size=count))
+
+    def reset(self, where=None):
+        """Новая партия на полях из маски where (по умолчанию на всех)"""
+        if where is None:
+            where = np.ones(self.count, dtype=bool)
+        count = int(where.sum())
+        self.boards[where] = 0
+        self.score[where] = 0
+        self.lines_cleared_total[where] = 0
+        self.level[where] = 1
+        self.game_over[where] = False
+        self.next_piece[where], self.next_color[where] = self.draw_pieces(count)
+        self.spawn(where)
+
+    def spawn(self, where):
+        """Следующая фигура становится текущей, проверяется конец игры"""
+        count = int(where.sum())
+        self.piece[where] = self.next_piece[where]
+        self.color[where] = self.next_color[where]
+        self.next_piece[where], self.next_color[where] = self.draw_pieces(count)
+        self.rotation[where] = 0
+        self.x[where] = self.width // 2 - SPAWN_WIDTHS[self.piece[where]] // 2
+        self.y[where] = 0
+        self.game_over |= where & self.collides(self.rotation, self.x, self.y)
+
+    def cells(self, rotation, x, y):
+        """Координаты клеток текущих фигур: два массива (N, 4)"""
+        offsets = OFFSETS[self.piece, rotation]
+        return y[:, None] + offsets[..., 0], x[:, None] + offsets[..., 1]
+
+    def collides(self, rotation, x, y):
+        """Для каждого поля: пересекается ли фигура в позиции (x, y) со стенами или блоками"""
+        ys, xs = self.cells(rotation, x, y)
+        outside = (xs < 0) | (xs >= self.width) | (ys >= self.height)
+        occupied = self.boards[self.rows,
+                               np.clip(ys, 0, self.height - 1),
+                               np.clip(xs, 0, self.width - 1)] != 0
+        return (outside | (occupied & (ys >= 0))).any(axis=1)
+
+    def shift(self, where, dx, dy, rotate=0):
+        """Сдвиг или поворот фигур на полях из where там, где он возможен"""
+        rotation = (self.rotation + rotate) % 4
+        ok = where & ~self.collides(rotation, self.x + dx, self.y + dy)
+        self.x[ok] += dx
+        self.y[ok] += dy
+        self.rotation[ok] = rotation[ok]
+        return ok
+
+    def hard_drop(self, where):
+        """Мгновенный сброс фигур, возвращает пройденное расстояние"""
+        distance = np.zeros(self.count, dtype=np.int64)
+        falling = where.copy()
+        while falling.any():
+            falling = self.shift(falling, 0, 1)
+            distance += falling
+        return distance
+
+    def lock(self, where):
+        """Фиксация фигур, очистка линий и начисление очков, возвращает очки за линии"""
+        ys, xs = self.cells(self.rotation, self.x, self.y)
+        index = np.nonzero(where)[0]
+        self.boards[index[:, None], ys[index], xs[index]] = (self.color[index] + 1)[:, None]
+
+        full = (self.boards != 0).all(axis=2) & where[:, None]
+        cleared = full.sum(axis=1)
+        clearing = cleared > 0
+        if clearing.any():
+            # Стабильная сортировка ставит заполненные строки наверх, не меняя порядок остальных
+            order = np.argsort(~full[clearing], axis=1, kind='stable')
+            boards = np.take_along_axis(self.boards[clearing], order[:, :, None], axis=1)
+            boards[np.arange(self.height)[None, :] < cleared[clearing][:, None]] = 0
+            self.boards[clearing] = boards
+
+        points = cleared * 100 * self.level
+        self.score += points
+        self.lines_cleared_total += cleared
+        self.level = self.lines_cleared_total // 10 + 1
+        self.spawn(where)
+        return points
+
+    def step(self, actions):
+        """Один шаг всех партий по массиву действий, возвращает (награды, маска конца игры)"""
+        actions = np.asarray(actions)
+        active = ~self.game_over
+        rewards = np.zeros(self.count, dtype=np.int64)
+
+        self.shift(active & (actions == LEFT), -1, 0)
+        self.shift(active & (actions == RIGHT), 1, 0)
+        self.shift(active & (actions == DOWN), 0, 1)
+        self.shift(active & (actions == ROTATE), 0, 0, rotate=1)
+        dropped = self.hard_drop(active & (actions == DROP)) * 2
+        self.score += dropped
+        rewards += dropped
+
+        # Гравитация: где фигура не может упасть, она фиксируется
+        falling = self.shift(active, 0, 1)
+        rewards += self.lock(active & ~falling)
+        return rewards, self.game_over.copy()
@@ -0,0 +1,411 @@
+import argparse
+import asyncio
+import random
+import struct
+import time
+from collections import deque
+
+from engine import Engine, Board
+from profiling import percentile
+from replay import (apply_input, write_varint, read_varint, encode_row, decode_row, encode_piece,
+                    decode_piece, PRESS_LEFT, PRESS_RIGHT, PRESS_DOWN, RELEASE_LEFT, RELEASE_RIGHT,
+                    RELEASE_DOWN, STEP_LEFT, STEP_RIGHT, STEP_DOWN, STEP_ROTATE, STEP_DROP)
+
+# Сетевой режим один на один. Сервер на asyncio сам ведет партии обоих игроков,
+# клиенты присылают только ввод, а получают состояние полей построчными дельтами.
+# Очищенные линии уходят сопернику мусорными строками (Engine.exchange_garbage).
+# Сообщение на проводе: длина (2 байта) и тело, первый байт тела — тип.
+
+TICK_MS = 50  # Период, с которым сервер продвигает все матчи и рассылает изменения
+SIM_STEP_MS = 5  # Шаг симуляции, как в tetris.py
+MAX_TICK_MS = 250  # Больше этого за один тик не догоняем
+SEND_BUFFER_SOFT = 16 * 1024  # Неотправленных байт, при которых дельты клиенту откладываются
+SEND_BUFFER_HARD = 256 * 1024  # Неотправленных байт, при которых клиент отключается
+MAX_MESSAGE = 64  # Сообщения клиента короткие, длиннее — ошибка протокола
+MAX_INPUTS_PER_TICK = 16  # Лишние нажатия и шаги за тик отбрасываются, отпускания применяются всегда
+
+FRAME = struct.Struct('<H')
+
+# Сообщения клиента
+JOIN = 1  # Имя игрока; встать в очередь на матч
+INPUT = 2  # Код ввода из replay.py
+# Сообщения сервера
+START = 16  # Сид, свой номер, ширина и высота поля, имя соперника
+STATE = 17  # Номер поля, счетчики, фигуры и изменившиеся строки
+END = 18  # Номер победителя
+
+DRAW = 255  # Победитель при ничьей
+
+# Ввод, который клиент может прислать (без RESET: новую партию начинает сервер)
+CLIENT_INPUTS = frozenset((PRESS_LEFT, PRESS_RIGHT, PRESS_DOWN, RELEASE_LEFT, RELEASE_RIGHT,
+                           RELEASE_DOWN, STEP_LEFT, STEP_RIGHT, STEP_DOWN, STEP_ROTATE, STEP_DROP))
+# Отпускания не ограничиваются лимитом ввода: повтор отпускания ничего не меняет
+RELEASE_INPUTS = frozenset((RELEASE_LEFT, RELEASE_RIGHT, RELEASE_DOWN))
+
+def frame(payload):
+    return FRAME.pack(len(payload)) + payload
+
+async def read_message(reader, limit=None):
+    """Тело следующего сообщения; ValueError, если оно длиннее limit"""
+    (length,) = FRAME.unpack(await reader.readexactly(FRAME.size))
+    if not length or (limit is not None and length > limit):
+        raise ValueError(f'Недопустимая длина сообщения: {length}')
+    return await reader.readexactly(length)
+
+class BoardSync:
+    """Что получатель уже знает о поле; по этому строится следующая дельта"""
+    __slots__ = ('revision', 'rows', 'top', 'head')
+
+    def __init__(self, height):
+        self.revision = -1
+        self.rows = [None] * height
+        self.top = 0  # Выше этой строки поле было пустым при прошлой отправке
+        self.head = b''
+
+    def delta(self, engine, slot):
+        """Сообщение STATE с изменениями с прошлой отправки или None, если изменений нет"""
+        head = bytearray((STATE, slot))
+        for value in (engine.score, engine.level, engine.lines_cleared_total,
+                      sum(count for count, _ in engine.pending_garbage), int(engine.game_over)):
+            write_varint(head, value)
+        encode_piece(head, engine.current_piece)
+        encode_piece(head, engine.next_piece)
+
+        board = engine.board
+        changed = []
+        if board.revision != self.revision:
+            # Поле менялось: сравниваем строки с отправленными
+            self.revision = board.revision
+            for i in range(min(board.top, self.top), board.height):
+                colors = board.row_colors(i)
+                if colors != self.rows[i]:
+                    self.rows[i] = colors[:]
+                    changed.append(i)
+            self.top = board.top
+        if not changed and head == self.head:
+            return None
+        self.head = head
+
+        message = bytearray(head)
+        write_varint(message, len(changed))
+        for i in changed:
+            write_varint(message, i)
+            encode_row(message, board.row(i), board.row_colors(i))
+        return bytes(message)
+
+class RemoteBoard:
+    """Поле соперника (или свое) на стороне клиента, собирается из сообщений STATE"""
+    def __init__(self, width, height):
+        self.board = Board(width, height)
+        self.score = 0
+        self.level = 1
+        self.lines_cleared_total = 0
+        self.pending_garbage = 0
+        self.game_over = False
+        self.current_piece = None
+        self.next_piece = None
+
+    def apply(self, data, pos=2):
+        """Применение тела STATE начиная с pos (после типа и номера поля)"""
+        values = []
+        for _ in range(5):
+            value, pos = read_varint(data, pos)
+            values.append(value)
+        self.score, self.level, self.lines_cleared_total, self.pending_garbage, game_over = values
+        self.game_over = bool(game_over)
+        self.current_piece, pos = decode_piece(data, pos)
+        self.next_piece, pos = decode_piece(data, pos)
+
+        board = self.board
+        changed, pos = read_varint(data, pos)
+        colors = [0] * board.width
+        for _ in range(changed):
+            i, pos = read_varint(data, pos)
+            mask, pos = decode_row(data, pos, colors)
+            board.set_row(i, mask, colors)
+        if changed:
+            board.rebuild_index()
+        return pos
+
+class Player:
+    """Подключение игрока"""
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.name = ''
+        self.match = None
+        self.slot = 0
+        self.inputs = 0  # Ввод за текущий тик
+        self.views = []  # BoardSync для каждого поля матча
+
+    def congested(self):
+        """Клиент не успевает читать: дельты копятся на стороне сервера, не в буфере"""
+        return self.writer.transport.get_write_buffer_size() > SEND_BUFFER_SOFT
+
+    def send(self, payload):
+        """Отправка без ожидания; клиент, который совсем не читает, отключается"""
+        transport = self.writer.transport
+        if transport.is_closing():
+            return False
+        if transport.get_write_buffer_size() > SEND_BUFFER_HARD:
+            transport.abort()
+            return False
+        self.writer.write(frame(payload))
+        return True
+
+class Match:
+    """Матч двух игроков: движки, обмен мусором и рассылка изменений"""
+    def __init__(self, server, players, seed):
+        self.server = server
+        self.players = players
+        # Одинаковая последовательность фигур у обоих игроков
+        self.engines = [Engine(seed=seed) for _ in players]
+        self.rng = random.Random(seed)  # Столбцы дыр в мусорных строках
+        self.over = False
+        board = self.engines[0].board
+        for slot, player in enumerate(players):
+            player.match = self
+            player.slot = slot
+            player.views = [BoardSync(board.height) for _ in players]
+        for player in players:
+            message = bytearray((START,))
+            for value in (seed, player.slot, board.width, board.height):
+                write_varint(message, value)
+            message.extend(' / '.join(other.name for other in players if other is not player).encode('utf-8'))
+            player.send(bytes(message))
+
+    def input(self, slot, code):
+        engine = self.engines[slot]
+        if not engine.game_over:
+            apply_input(engine, code)
+
+    def tick(self, ms):
+        for engine in self.engines:
+            engine.advance(ms, SIM_STEP_MS)
+
+        # Мусор уходит всем соперникам, дыра одна на всю пачку строк
+        for engine in self.engines:
+            if engine.outgoing_garbage:
+                hole = self.rng.randrange(engine.board.width)
+                for other in self.engines:
+                    if other is not engine and not other.game_over:
+                        other.receive_garbage(engine.outgoing_garbage, hole)
+                engine.outgoing_garbage = 0
+
+        self.broadcast()
+        alive = [slot for slot, engine in enumerate(self.engines) if not engine.game_over]
+        if len(alive) < len(self.engines):
+            self.finish(alive[0] if len(alive) == 1 else DRAW)
+
+    def broadcast(self):
+        for player in self.players:
+            player.inputs = 0
+            if player.congested():
+                continue  # Изменения не теряются: следующая дельта считается от того, что клиент получил
+            for slot, engine in enumerate(self.engines):
+                payload = player.views[slot].delta(engine, slot)
+                if payload:
+                    player.send(payload)
+
+    def finish(self, winner):
+        if self.over:
+            return
+        self.over = True
+        self.broadcast()
+        for player in self.players:
+            player.send(bytes((END, winner)))
+            player.match = None
+            player.views = []
+        self.server.finish_match(self)
+
+    def leave(self, player):
+        """Игрок отключился: победа остальным (в матче на двоих — сопернику)"""
+        others = [other.slot for other in self.players if other is not player]
+        self.players.remove(player)
+        player.match = None
+        self.finish(others[0] if len(others) == 1 else DRAW)
+
+class BattleServer:
+    """Сервер матчей: очередь ожидания, общий тик для всех матчей"""
+    def __init__(self, tick_ms=TICK_MS, seed=None):
+        self.tick_ms = tick_ms
+        self.rng = random.Random(seed)
+        self.waiting = None
+        self.matches = set()
+        self.connections = 0
+        self.matches_played = 0
+        self.tick_times = deque(maxlen=200)  # Длительность последних тиков, мс
+
+    def matchmake(self, player):
+        if player.match or self.waiting is player:
+            return
+        waiting = self.waiting
+        if waiting is None or waiting.writer.transport.is_closing():
+            self.waiting = player
+            return
+        self.waiting = None
+        self.matches.add(Match(self, [waiting, player], self.rng.getrandbits(32)))
+
+    def finish_match(self, match):
+        self.matches.discard(match)
+        self.matches_played += 1
+
+    async def handle(self, reader, writer):
+        player = Player(reader, writer)
+        self.connections += 1
+        try:
+            while True:
+                payload = await read_message(reader, MAX_MESSAGE)
+                kind = payload[0]
+                if kind == JOIN:
+                    player.name = payload[1:17].decode('utf-8', 'replace')
+                    self.matchmake(player)
+                elif kind == INPUT and len(payload) == 2 and payload[1] in CLIENT_INPUTS:
+                    # Пропущенное отпускание оставило бы клавишу зажатой на сервере до конца матча
+                    code = payload[1]
+                    if player.match and (code in RELEASE_INPUTS or player.inputs < MAX_INPUTS_PER_TICK):
+                        player.inputs += 1
+                        player.match.input(player.slot, code)
+                else:
+                    break  # Неизвестное сообщение: клиент сломан, отключаем
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            if self.waiting is player:
+                self.waiting = None
+            if player.match:
+                player.match.leave(player)
+            writer.close()
+
+    async def tick_loop(self):
+        loop = asyncio.get_running_loop()
+        last = loop.time()
+        while True:
+            await asyncio.sleep(self.tick_ms / 1000)
+            now = loop.time()
+            # Время матчей идет шагами симуляции, остаток переходит в следующий тик
+            ms = int((now - last) * 1000) // SIM_STEP_MS * SIM_STEP_MS
+            last += ms / 1000
+            if ms > MAX_TICK_MS:
+                ms = MAX_TICK_MS
+                last = now
+            started = time.perf_counter()
+            for match in list(self.matches):
+                match.tick(ms)
+            self.tick_times.append((time.perf_counter() - started) * 1000)
+
+    def tick_percentile(self, q):
+        return percentile(self.tick_times, q)
+
+    async def serve(self, host='127.0.0.1', port=7777, report_interval=None):
+        server = await asyncio.start_server(self.handle, host, port, limit=4 * MAX_MESSAGE,
+                                            backlog=4096)
+        ticker = asyncio.create_task(self.tick_loop())
+        try:
+            async with server:
+                if report_interval is None:
+                    await server.serve_forever()
+                while True:
+                    await asyncio.sleep(report_interval)
+                    print(f'подключений {self.connections}, матчей {len(self.matches)}, '
+                          f'сыграно {self.matches_played}, тик p50 {self.tick_percentile(50):.2f} мс, '
+                          f'p99 {self.tick_percentile(99):.2f} мс')
+        finally:
+            ticker.cancel()
+
+async def simulated_player(host, port, name, matches, interval, rng, stats):
+    """Клиент нагрузочного теста: случайный ввод и сборка полей из дельт"""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(frame(bytes((JOIN,)) + name.encode('utf-8')))
+    boards = {}
+    sender = None
+
+    async def send_inputs():
+        while True:
+            await asyncio.sleep(interval * rng.uniform(0.5, 1.5))
+            code = rng.choices((STEP_LEFT, STEP_RIGHT, STEP_ROTATE, STEP_DROP), (3, 3, 2, 1))[0]
+            writer.write(frame(bytes((INPUT, code))))
+
+    played = 0
+    try:
+        while played < matches:
+            payload = await read_message(reader)
+            stats['bytes'] += FRAME.size + len(payload)
+            kind = payload[0]
+            if kind == START:
+                pos = 1
+                values = []
+                for _ in range(4):
+                    value, pos = read_varint(payload, pos)
+                    values.append(value)
+                _, slot, width, height = values
+                boards = {i: RemoteBoard(width, height) for i in range(2)}
+                sender = asyncio.create_task(send_inputs())
+            elif kind == STATE:
+                boards[payload[1]].apply(payload)
+                stats['states'] += 1
+            elif kind == END:
+                sender.cancel()
+                played += 1
+                stats['matches'] += 1
+                if played < matches:
+                    writer.write(frame(bytes((JOIN,)) + name.encode('utf-8')))
+    finally:
+        if sender:
+            sender.cancel()
+        writer.close()
+
+async def load_test(host, port, players, matches, interval, local=False, seed=0):
+    """Много игроков одновременно; с local сервер запускается в этом же цикле событий"""
+    server_task = None
+    server = None
+    if local:
+        server = BattleServer(seed=seed)
+        server_task = asyncio.create_task(server.serve(host, port))
+        await asyncio.sleep(0.1)
+    stats = {'matches': 0, 'states': 0, 'bytes': 0}
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(simulated_player(host, port, f'bot{i}', matches, interval, random.Random(rng.random()), stats)
+          for i in range(players)),
+        return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    if server_task:
+        server_task.cancel()
+    errors = [result for result in results if isinstance(result, Exception)]
+
+    print(f'Игроков: {players}, ошибок: {len(errors)}, за {elapsed:.1f} с')
+    print(f"Матчей (по игрокам): {stats['matches']}, сообщений STATE: {stats['states']}, "
+          f"{stats['states'] / elapsed:.0f} в секунду")
+    if stats['states']:
+        print(f"Получено {stats['bytes'] / 1024:.0f} КиБ, в среднем {stats['bytes'] / stats['states']:.1f} байт "
+              f"на сообщение")
+    if server:
+        print(f'Тик сервера p50 {server.tick_percentile(50):.2f} мс, p99 {server.tick_percentile(99):.2f} мс')
+    return stats, errors
+
+def main():
+    parser = argparse.ArgumentParser(description='Сервер матчей один на один и нагрузочный тест')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='Запустить сервер')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=7777)
+    serve.add_argument('--report', type=float, default=5.0, help='Интервал отчета, с')
+    load = commands.add_parser('loadtest', help='Нагрузочный тест')
+    load.add_argument('--host', default='127.0.0.1')
+    load.add_argument('--port', type=int, default=7777)
+    load.add_argument('--players', type=int, default=200, help='Одновременных игроков')
+    load.add_argument('--matches', type=int, default=1, help='Матчей на каждого игрока')
+    load.add_argument('--interval', type=float, default=0.1, help='Средний интервал ввода, с')
+    load.add_argument('--local', action='store_true', help='Поднять сервер в этом же процессе')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        asyncio.run(BattleServer().serve(args.host, args.port, args.report))
+    else:
+        asyncio.run(load_test(args.host, args.port, args.players, args.matches, args.interval, args.local))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+
+# Без дисплея: pygame должен увидеть драйвер до импорта tetris; без приветствия pygame в выводе
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from engine import GRID_WIDTH, GRID_HEIGHT, COLORS, DROP, Board, Engine
+from profiling import percentile
+
+# Набор замеров производительности: горячие места правил, отрисовка и целые партии.
+# Результаты сохраняются в JSON, с которым потом сравниваются новые прогоны.
+
+SCREEN_SIZES = [(1280, 720), (1920, 1080), (2560, 1440)]
+FILL_LEVELS = [0.0, 0.5, 0.9]  # Доля высоты поля, занятая блоками
+LARGE_BOARD = (100, 10000)  # Поле для нагрузочных замеров: ширина и высота в блоках
+DEFAULT_THRESHOLD = 10  # Замедление больше этого процента считается регрессией
+
+# Имя замера -> функция подготовки, которая возвращает замеряемую функцию или пару
+# (замеряемая функция, сброс состояния перед каждым ее вызовом, в замер не входит)
+BENCHMARKS = {}
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+def crafted_board(fill=0.0, full_lines=0, size=(GRID_WIDTH, GRID_HEIGHT)):
+    """Поле, заполненное снизу на долю fill: в каждой строке одна дыра, внизу full_lines полных строк"""
+    board = Board(*size)
+    filled = max(full_lines, int(board.height * fill))
+    for n in range(filled):
+        i = board.height - 1 - n
+        mask = board.full_row
+        if n >= full_lines:
+            mask &= ~(1 << (n * 5 % board.width))  # Дыра, чтобы строка не очищалась
+        board.place((mask,), 0, i, COLORS[n % len(COLORS)])
+    return board
+
+def crafted_engine(fill=0.0, full_lines=0, size=(GRID_WIDTH, GRID_HEIGHT)):
+    engine = Engine(seed=0, width=size[0], height=size[1])
+    engine.board = crafted_board(fill, full_lines, size)
+    return engine
+
+# Правила
+
+for fill in FILL_LEVELS:
+    def valid_move_setup(fill=fill):
+        engine = crafted_engine(fill)
+        piece = engine.current_piece
+        landing = engine.landing_y(piece)
+        return lambda: engine.valid_move(piece, piece['x'], landing)
+    benchmark(f'rules/valid_move/fill{fill:.0%}')(valid_move_setup)
+
+    def drop_piece_setup(fill=fill):
+        engine = crafted_engine(fill)
+        piece = engine.current_piece
+
+        def run():
+            piece['y'] = 0
+            engine.drop_piece()
+        return run
+    benchmark(f'rules/drop_piece/fill{fill:.0%}')(drop_piece_setup)
+
+@benchmark('rules/rotate_piece')
+def rotate_piece_setup():
+    engine = crafted_engine(0.5)
+    return engine.rotate_piece
+
+def remove_lines_setup(full_lines, size=(GRID_WIDTH, GRID_HEIGHT)):
+    # Очистка меняет поле, поэтому перед каждым вызовом оно возвращается к снимку вне замера;
+    # unshare там же, чтобы очистка не платила за копирование списков, общих со снимком
+    engine = crafted_engine(0.5, full_lines, size)
+    snapshot = engine.board.snapshot()
+
+    def reset():
+        engine.board.restore(snapshot)
+        engine.board.unshare()
+    return engine.remove_complete_lines, reset
+
+for full_lines in range(5):
+    benchmark(f'rules/remove_complete_lines/{full_lines}')(
+        lambda full_lines=full_lines: remove_lines_setup(full_lines))
+
+@benchmark('rules/snapshot')
+def snapshot_setup():
+    return crafted_engine(0.5).snapshot
+
+@benchmark('rules/rewind')
+def rewind_setup():
+    # Отмена фигуры и ее повторная постановка: снимок, возврат и копирование общих строк при записи
+    engine = Engine(seed=0, rewind_depth=2)
+
+    def run():
+        engine.step(DROP)
+        engine.tick(engine.fall_speed)
+        engine.rewind()
+    return run
+
+# Большое поле: цена хода и очистки не должна зависеть от высоты поля
+
+large = f'{LARGE_BOARD[0]}x{LARGE_BOARD[1]}'
+
+@benchmark(f'rules/drop_piece/{large}')
+def large_drop_piece_setup():
+    engine = crafted_engine(0.5, size=LARGE_BOARD)
+    piece = engine.current_piece
+
+    def run():
+        piece['y'] = 0
+        engine.drop_piece()
+    return run
+
+benchmark(f'rules/remove_complete_lines/4/{large}')(lambda: remove_lines_setup(4, LARGE_BOARD))
+
+# Отрисовка
+
+def make_game(size, fill=0.0, board_size=(GRID_WIDTH, GRID_HEIGHT)):
+    import tetris
+    game = tetris.Tetris(seed=0, screen_size=size, board_size=board_size)
+    game.engine.board = crafted_board(fill, size=board_size)
+    return game
+
+@benchmark('render/draw_block')
+def draw_block_setup():
+    game = make_game(SCREEN_SIZES[0])
+    return lambda: game.draw_block(game.grid_left, 0, COLORS[0])
+
+for size in SCREEN_SIZES:
+    label = f'{size[0]}x{size[1]}'
+
+    def draw_background_setup(size=size):
+        return make_game(size).draw_background
+    benchmark(f'render/draw_background/{label}')(draw_background_setup)
+
+    for fill in FILL_LEVELS:
+        def draw_full_setup(size=size, fill=fill):
+            game = make_game(size, fill)
+
+            def run():
+                game.last_frame = None  # Каждый раз полная перерисовка
+                game.draw()
+            return run
+        benchmark(f'render/draw/full/{label}/fill{fill:.0%}')(draw_full_setup)
+
+        def draw_incremental_setup(size=size, fill=fill):
+            # Фигура ходит влево-вправо: обычный кадр игры с небольшим числом изменений
+            game = make_game(size, fill)
+            game.draw()
+            moves = [-1, 1]
+
+            def run():
+                game.engine.move(moves[0], 0)
+                moves.reverse()
+                game.draw()
+            return run
+        benchmark(f'render/draw/incremental/{label}/fill{fill:.0%}')(draw_incremental_setup)
+
+@benchmark(f'render/draw/incremental/{large}')
+def large_draw_incremental_setup():
+    # Рисуется только окно поля, поэтому кадр стоит как на обычном поле
+    game = make_game(SCREEN_SIZES[0], 0.5, LARGE_BOARD)
+    game.draw()
+    moves = [-1, 1]
+
+    def run():
+        game.engine.move(moves[0], 0)
+        moves.reverse()
+        game.draw()
+    return run
+
+# Целые партии без дисплея
+
+for strategy in ('random', 'greedy'):
+    def game_setup(strategy=strategy):
+        from selfplay import play_game
+        return lambda: play_game((0, strategy, 200, None))
+    benchmark(f'game/{strategy}')(game_setup)
+
+def measure(run, min_time=0.2, repeat=5):
+    """Лучшее и медианное время одного вызова в секундах"""
+    if isinstance(run, tuple):
+        # Со сбросом каждый вызов замеряется отдельно: timeit выполняет setup перед каждым повтором
+        run, reset = run
+        number, total = timeit.Timer(lambda: (reset(), run())).autorange()
+        calls = max(repeat, int(number * min_time * repeat / total))
+        times = sorted(timeit.Timer(run, reset).repeat(calls, 1))
+        return {'best': times[0], 'median': percentile(times, 50), 'number': 1}
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    times = sorted(t / number for t in timer.repeat(repeat, number))
+    return {'best': times[0], 'median': percentile(times, 50), 'number': number}
+
+def run_benchmarks(pattern=None, min_time=0.2, repeat=5, report=None):
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if pattern and pattern not in name:
+            continue
+        results[name] = measure(setup(), min_time, repeat)
+        if report:
+            report(name, results[name])
+    return results
+
+def environment():
+    import pygame
+    return {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Сравнение с сохраненным прогоном по лучшему времени, возвращает список регрессий"""
+    regressions = []
+    for name, result in results.items():
+        old = baseline['results'].get(name)
+        if old is None:
+            print(f'{name:50} {format_time(result["best"]):>10}  нет в базе')
+            continue
+        change = (result['best'] / old['best'] - 1) * 100
+        flag = ''
+        if change > threshold:
+            flag = 'РЕГРЕССИЯ'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = 'ускорение'
+        print(f'{name:50} {format_time(old["best"]):>10} -> {format_time(result["best"]):>10} '
+              f'{change:+7.1f}% {flag}')
+    return regressions
+
+def format_time(seconds):
+    if seconds >= 1e-3:
+        return f'{seconds * 1e3:.2f} мс'
+    return f'{seconds * 1e6:.2f} мкс'
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры правил и отрисовки без дисплея')
+    parser.add_argument('--filter', default=None, help='Только замеры, в имени которых есть строка')
+    parser.add_argument('--save', metavar='FILE', help='Сохранить результаты как базу (JSON)')
+    parser.add_argument('--compare', metavar='FILE', help='Сравнить с сохраненной базой')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Порог регрессии в процентах')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Длительность одного повтора, с')
+    parser.add_argument('--repeat', type=int, default=5, help='Количество повторов')
+    parser.add_argument('--list', action='store_true', help='Только показать список замеров')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(name for name in BENCHMARKS if not args.filter or args.filter in name))
+        return
+
+    def report(name, result):
+        if not args.compare:
+            print(f'{name:50} {format_time(result["best"]):>10}  (медиана {format_time(result["median"])})')
+
+    results = run_benchmarks(args.filter, args.min_time, args.repeat, report)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=1)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'Регрессий: {len(regressions)}')
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
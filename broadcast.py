@@ -0,0 +1,460 @@
+import argparse
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+import zlib
+
+from engine import GRID_WIDTH, GRID_HEIGHT, COLORS, PIECES, Board
+from replay import write_varint, read_varint, encode_row, decode_row
+
+# Трансляция партии для зрителей: поле, фигуры, счет, уровень и линии.
+# Поток состоит из ключевых кадров (полное состояние) и разностей с предыдущим кадром.
+# Игровой цикл только снимает состояние и кладет его в ограниченную очередь; кодирование
+# и отправка идут в фоновом потоке, при переполнении очереди снимки отбрасываются.
+# Версия 2: в заголовке потока размер поля, строки передаются только от верха стопки,
+# длина тела кадра 4 байта, предел длины зависит от размера поля.
+
+STREAM_MAGIC = b'TSTR'
+STREAM_VERSION = 2
+SYNC = b'\xa5\x5a'  # Начало кадра: по нему зритель находит границу кадра с любого места
+# Заголовок кадра: синхронизация, тип, номер, игровое время, длина и CRC32 тела
+FRAME_HEADER = struct.Struct('<2sBIIII')
+FRAME_HEADER_V1 = struct.Struct('<2sBIIHI')
+MAX_PAYLOAD_V1 = 4096
+
+KEYFRAME = 1
+DIFF = 2
+
+# Что изменилось в кадре-разности
+CHANGED_COUNTERS = 1
+CHANGED_CURRENT = 2
+CHANGED_NEXT = 4
+CHANGED_ROWS = 8
+
+KEYFRAME_INTERVAL = 2.0  # Секунд между ключевыми кадрами, столько максимум ждет новый зритель
+QUEUE_SIZE = 16  # Снимков в очереди к фоновому потоку
+CLIENT_BUFFER = 256 * 1024  # Неотправленных байт у зрителя, после которых он отключается
+
+def piece_key(piece):
+    """Фигура кортежем: (id, поворот, индекс цвета, x, y)"""
+    return (piece['id'], piece['rotation'], COLORS.index(piece['color']), piece['x'], piece['y'])
+
+def stream_header(width, height):
+    """Начало потока: сигнатура, версия и размер поля"""
+    header = bytearray(STREAM_MAGIC)
+    header.append(STREAM_VERSION)
+    write_varint(header, width)
+    write_varint(header, height)
+    return bytes(header)
+
+def read_stream_header(data):
+    """(версия, ширина, высота, длина заголовка) или None, если байт еще не хватает"""
+    if len(data) < 5:
+        return None
+    if data[:4] != STREAM_MAGIC or not 1 <= data[4] <= STREAM_VERSION:
+        raise ValueError('Неизвестный формат потока')
+    if data[4] == 1:
+        return 1, GRID_WIDTH, GRID_HEIGHT, 5  # Версия 1 писалась только для обычного поля
+    try:
+        width, pos = read_varint(data, 5)
+        height, pos = read_varint(data, pos)
+    except IndexError:
+        return None
+    return data[4], width, height, pos
+
+def max_payload(width, height):
+    """Предел длины тела кадра: все строки поля с номерами, фигуры и счетчики"""
+    return 64 + height * (width + width // 7 + 6)
+
+def encode_piece_key(buffer, key):
+    for value in key:
+        write_varint(buffer, value)
+
+def decode_piece_key(data, pos):
+    values = []
+    for _ in range(5):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    return tuple(values), pos
+
+class StreamEncoder:
+    """Снимки состояния в кадры: ключевой раз в interval секунд, иначе разность с прошлым"""
+    def __init__(self, interval=KEYFRAME_INTERVAL):
+        self.interval = interval
+        self.last = None
+        self.last_keyframe = None
+        self.sequence = 0
+
+    def encode(self, snapshot):
+        """Кадр целиком (заголовок и тело) и его тип"""
+        elapsed, counters, current, next_key, top, rows = snapshot
+        now = time.monotonic()
+        payload = bytearray()
+        if self.last is None or now - self.last_keyframe >= self.interval:
+            kind = KEYFRAME
+            self.last_keyframe = now
+            for value in counters:
+                write_varint(payload, value)
+            encode_piece_key(payload, current)
+            encode_piece_key(payload, next_key)
+            write_varint(payload, top)
+            write_varint(payload, len(rows))
+            for mask, colors in rows:
+                encode_row(payload, mask, colors)
+        else:
+            kind = DIFF
+            _, last_counters, last_current, last_next, last_top, last_rows = self.last
+            changed_rows = []
+            if rows is not last_rows:
+                # Строки хранятся от верха стопки; выше него поле пустое
+                empty = None
+                for i in range(min(top, last_top), top + len(rows)):
+                    row = rows[i - top] if i >= top else None
+                    last_row = last_rows[i - last_top] if i >= last_top else None
+                    if row != last_row:
+                        if row is None:
+                            empty = empty or (0, (0,) * len(last_row[1]))
+                            row = empty
+                        changed_rows.append((i, row))
+            flags = ((counters != last_counters) * CHANGED_COUNTERS
+                     | (current != last_current) * CHANGED_CURRENT
+                     | (next_key != last_next) * CHANGED_NEXT
+                     | bool(changed_rows) * CHANGED_ROWS)
+            payload.append(flags)
+            if flags & CHANGED_COUNTERS:
+                for value in counters:
+                    write_varint(payload, value)
+            if flags & CHANGED_CURRENT:
+                encode_piece_key(payload, current)
+            if flags & CHANGED_NEXT:
+                encode_piece_key(payload, next_key)
+            if flags & CHANGED_ROWS:
+                write_varint(payload, len(changed_rows))
+                for i, row in changed_rows:
+                    write_varint(payload, i)
+                    encode_row(payload, *row)
+        self.last = snapshot
+        self.sequence += 1
+        header = FRAME_HEADER.pack(SYNC, kind, self.sequence, elapsed & 0xffffffff, len(payload),
+                                   zlib.crc32(payload))
+        return header + payload, kind
+
+class FileSink:
+    """Поток в файл; зритель может читать его целиком или подключиться к хвосту (--follow)"""
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+
+    def start(self, header):
+        self.file.write(header)
+
+    def write(self, frame, kind):
+        self.file.write(frame)
+        self.file.flush()
+
+    def poll(self):
+        pass
+
+    def close(self):
+        self.file.close()
+
+class SocketSink:
+    """Зрители по TCP: новому зрителю сразу уходят последний ключевой кадр и разности после него"""
+    def __init__(self, host='127.0.0.1', port=7778):
+        self.server = socket.create_server((host, port))
+        self.server.setblocking(False)
+        self.clients = {}  # Сокет -> неотправленные байты
+        self.since_keyframe = []  # Кадры начиная с последнего ключевого
+        self.header = b''
+
+    def start(self, header):
+        self.header = header
+
+    def write(self, frame, kind):
+        if kind == KEYFRAME:
+            self.since_keyframe = []
+        self.since_keyframe.append(frame)
+        self.poll()
+        for client in list(self.clients):
+            self.send(client, frame)
+
+    def poll(self):
+        """Прием новых зрителей и досылка накопленного"""
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                break  # Новых подключений нет
+            client.setblocking(False)
+            self.clients[client] = bytearray()
+            self.send(client, self.header + b''.join(self.since_keyframe))
+        for client in list(self.clients):
+            self.send(client, b'')
+
+    def send(self, client, data):
+        pending = self.clients[client]
+        pending += data
+        try:
+            sent = client.send(pending) if pending else 0
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.drop(client)
+            return
+        del pending[:sent]
+        if len(pending) > CLIENT_BUFFER:
+            self.drop(client)  # Зритель не успевает читать
+
+    def drop(self, client):
+        del self.clients[client]
+        client.close()
+
+    def close(self):
+        for client in list(self.clients):
+            self.drop(client)
+        self.server.close()
+
+class Broadcaster:
+    """Публикация состояния из игрового цикла; кодирование и отправка в фоновом потоке"""
+    def __init__(self, sinks, width=GRID_WIDTH, height=GRID_HEIGHT, interval=KEYFRAME_INTERVAL,
+                 queue_size=QUEUE_SIZE):
+        self.sinks = sinks
+        for sink in sinks:
+            sink.start(stream_header(width, height))
+        self.encoder = StreamEncoder(interval)
+        self.queue = queue.Queue(queue_size)
+        self.last = None  # Последний поставленный в очередь снимок (без времени)
+        self.board = None
+        self.revision = None
+        self.top = None
+        self.rows = None
+        self.published = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, name='broadcast', daemon=True)
+        self.thread.start()
+
+    def publish(self, engine):
+        """Снимок состояния в очередь, если оно изменилось; никогда не ждет"""
+        board = engine.board
+        if board is not self.board or board.revision != self.revision:
+            # Строки копируются только когда поле менялось, иначе снимки делят один кортеж.
+            # Пустое поле выше стопки не копируется и не передается
+            self.board = board
+            self.revision = board.revision
+            self.top = board.top
+            self.rows = tuple((mask, colors) for _, mask, colors in board.stored_rows())
+        state = ((engine.score, engine.level, engine.lines_cleared_total, int(engine.game_over)),
+                 piece_key(engine.current_piece), piece_key(engine.next_piece), self.top, self.rows)
+        if state == self.last:
+            return
+        try:
+            self.queue.put_nowait((engine.elapsed, *state))
+        except queue.Full:
+            self.dropped += 1  # self.last не меняется: то же состояние уйдет при следующем вызове
+            return
+        self.last = state
+        self.published += 1
+
+    def run(self):
+        while True:
+            try:
+                snapshot = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                for sink in self.sinks:
+                    sink.poll()
+                continue
+            if snapshot is None:
+                break
+            frame, kind = self.encoder.encode(snapshot)
+            for sink in self.sinks:
+                sink.write(frame, kind)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        for sink in self.sinks:
+            sink.close()
+
+class StreamDecoder:
+    """Состояние игры, собранное из потока; до первого ключевого кадра разности пропускаются.
+
+    Без размера поля поток должен начинаться с заголовка (stream_header), размер берется из него."""
+    def __init__(self, width=None, height=None, version=STREAM_VERSION):
+        self.buffer = bytearray()
+        self.board = None
+        self.version = version
+        if width is not None:
+            self.resize(width, height)
+        self.score = 0
+        self.level = 1
+        self.lines_cleared_total = 0
+        self.game_over = False
+        self.current_piece = None
+        self.next_piece = None
+        self.elapsed = 0
+        self.synced = False
+        self.sequence = None
+        self.frames = 0
+        self.skipped = 0
+
+    def resize(self, width, height):
+        self.board = Board(width, height)
+        if self.version == 1:
+            self.frame_header, self.max_payload = FRAME_HEADER_V1, MAX_PAYLOAD_V1
+        else:
+            self.frame_header, self.max_payload = FRAME_HEADER, max_payload(width, height)
+
+    def feed(self, data):
+        """Разбор пришедших байт, возвращает число примененных кадров"""
+        buffer = self.buffer
+        buffer += data
+        applied = 0
+        if self.board is None:
+            header = read_stream_header(buffer)
+            if header is None:
+                return applied
+            self.version, width, height, length = header
+            self.resize(width, height)
+            del buffer[:length]
+        frame_header = self.frame_header
+        while True:
+            start = buffer.find(SYNC)
+            if start < 0:
+                del buffer[:max(0, len(buffer) - 1)]
+                return applied
+            del buffer[:start]
+            if len(buffer) < frame_header.size:
+                return applied
+            _, kind, sequence, elapsed, length, crc = frame_header.unpack_from(buffer)
+            if kind not in (KEYFRAME, DIFF) or length > self.max_payload:
+                del buffer[:1]  # Случайное совпадение с SYNC, ищем дальше
+                continue
+            end = frame_header.size + length
+            if len(buffer) < end:
+                return applied
+            payload = bytes(buffer[frame_header.size:end])
+            if zlib.crc32(payload) != crc:
+                del buffer[:1]
+                continue
+            del buffer[:end]
+
+            if kind == DIFF and (not self.synced or sequence != self.sequence + 1):
+                self.synced = False  # Пропущен кадр: ждем следующий ключевой
+                self.skipped += 1
+                continue
+            self.apply(kind, payload)
+            self.synced = True
+            self.sequence = sequence
+            self.elapsed = elapsed
+            self.frames += 1
+            applied += 1
+
+    def apply(self, kind, data):
+        flags = (CHANGED_COUNTERS | CHANGED_CURRENT | CHANGED_NEXT) if kind == KEYFRAME else data[0]
+        pos = 0 if kind == KEYFRAME else 1
+        if flags & CHANGED_COUNTERS:
+            values = []
+            for _ in range(4):
+                value, pos = read_varint(data, pos)
+                values.append(value)
+            self.score, self.level, self.lines_cleared_total, game_over = values
+            self.game_over = bool(game_over)
+        if flags & CHANGED_CURRENT:
+            self.current_piece, pos = decode_piece_key(data, pos)
+        if flags & CHANGED_NEXT:
+            self.next_piece, pos = decode_piece_key(data, pos)
+
+        board = self.board
+        colors = [0] * board.width
+        if kind == KEYFRAME:
+            # Ключевой кадр собирает поле заново: строки выше переданных пустые
+            board = self.board = Board(board.width, board.height)
+            top = 0
+            if self.version > 1:
+                top, pos = read_varint(data, pos)
+            count, pos = read_varint(data, pos)
+            for i in range(top, top + count):
+                mask, pos = decode_row(data, pos, colors)
+                board.set_row(i, mask, colors)
+        elif flags & CHANGED_ROWS:
+            count, pos = read_varint(data, pos)
+            for _ in range(count):
+                i, pos = read_varint(data, pos)
+                mask, pos = decode_row(data, pos, colors)
+                board.set_row(i, mask, colors)
+        if kind == KEYFRAME or flags & CHANGED_ROWS:
+            board.rebuild_index()
+
+    def render(self):
+        """Поле текстом: # — блоки, @ — текущая фигура; пустой верх большого поля не рисуется"""
+        cells = set()
+        first = max(0, self.board.height - GRID_HEIGHT)
+        if self.current_piece:
+            piece_id, rotation, _, x, y = self.current_piece
+            cells = {(y + i, x + j) for i, j in PIECES[piece_id][rotation].cells}
+            first = min(first, y)
+        first = min(first, self.board.top)
+        lines = [f'Счет: {self.score}  Уровень: {self.level}  Линий: {self.lines_cleared_total}'
+                 + ('  КОНЕЦ ИГРЫ' if self.game_over else '')]
+        for i in range(first, self.board.height):
+            colors = self.board.row_colors(i)
+            lines.append('|' + ''.join('@' if (i, j) in cells else '#' if color else ' '
+                                       for j, color in enumerate(colors)) + '|')
+        lines.append('+' + '-' * self.board.width + '+')
+        return '\n'.join(lines)
+
+def view(source, follow=False, quiet=False):
+    """Эталонный зритель: 'host:port' или путь к файлу потока; размер поля берется из заголовка"""
+    decoder = StreamDecoder()
+
+    def show(applied):
+        if applied and not quiet:
+            sys.stdout.write('\x1b[H\x1b[2J' + decoder.render() + '\n')
+            sys.stdout.flush()
+
+    if os.path.exists(source):
+        with open(source, 'rb') as f:
+            if follow:
+                # Подключение к середине потока: размер поля из заголовка, дальше ждем ключевой кадр
+                header = f.read(32)
+                while read_stream_header(header) is None:
+                    time.sleep(0.05)  # Файл только создан, заголовок еще дописывается
+                    header += f.read(32)
+                _, width, height, _ = read_stream_header(header)
+                decoder = StreamDecoder(width, height, header[4])
+                f.seek(0, os.SEEK_END)
+            while True:
+                data = f.read(65536)
+                if data:
+                    show(decoder.feed(data))
+                elif follow:
+                    time.sleep(0.05)
+                else:
+                    break
+    else:
+        host, port = source.rsplit(':', 1)
+        with socket.create_connection((host, int(port))) as connection:
+            while True:
+                data = connection.recv(65536)
+                if not data:
+                    break
+                show(decoder.feed(data))
+    return decoder
+
+def main():
+    parser = argparse.ArgumentParser(description='Зритель трансляции партии')
+    parser.add_argument('source', help='host:port трансляции или файл потока')
+    parser.add_argument('--follow', action='store_true', help='Читать дописываемый файл с конца')
+    parser.add_argument('--quiet', action='store_true', help='Не рисовать поле, только итог')
+    args = parser.parse_args()
+    try:
+        decoder = view(args.source, args.follow, args.quiet)
+    except KeyboardInterrupt:
+        return
+    print(f'Кадров: {decoder.frames}, пропущено: {decoder.skipped}, счет: {decoder.score}')
+
+if __name__ == '__main__':
+    main()
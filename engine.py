@@ -0,0 +1,762 @@
+import random
+from collections import deque
+
+# Игровые правила без зависимости от pygame: поле, фигуры, счет, уровни.
+# Время передается снаружи через Engine.tick, поэтому движок работает и без дисплея.
+
+# Константы
+GRID_WIDTH = 12  # Ширина игрового поля в блоках
+GRID_HEIGHT = 22  # Высота игрового поля в блоках
+
+# Цвета фигур
+CYAN = (0, 240, 240)  # Более яркий циан
+YELLOW = (240, 240, 0)  # Более яркий желтый
+MAGENTA = (240, 0, 240)  # Более яркая пурпурная
+RED = (240, 0, 0)  # Более яркий красный
+GREEN = (0, 240, 0)  # Более яркий зеленый
+BLUE = (0, 0, 240)  # Более яркий синий
+ORANGE = (240, 160, 0)  # Более яркий оранжевый
+
+COLORS = [CYAN, YELLOW, MAGENTA, RED, GREEN, BLUE, ORANGE]
+GARBAGE_COLOR = (110, 110, 120)  # Мусорные строки от соперника
+CELL_COLORS = COLORS + [GARBAGE_COLOR]  # Все цвета клеток поля, их индексы используются в форматах
+
+# Мусорных строк сопернику за 0, 1, 2, 3 и 4 линии, очищенные одной фигурой
+GARBAGE_LINES = (0, 0, 1, 2, 4)
+
+REWIND_DEPTH = 32  # Сколько последних фигур можно отменить в режиме тренировки
+
+# Строки поля хранятся кусками по CHUNK_ROWS: запись после снимка копирует один кусок, а не все поле
+CHUNK_BITS = 6
+CHUNK_ROWS = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_ROWS - 1
+
+# Фигуры тетрамино
+SHAPES = [
+    [[1, 1, 1, 1]],  # I
+    [[1, 1], [1, 1]],  # O
+    [[1, 1, 1], [0, 1, 0]],  # T
+    [[1, 1, 1], [1, 0, 0]],  # L
+    [[1, 1, 1], [0, 0, 1]],  # J
+    [[1, 1, 0], [0, 1, 1]],  # S
+    [[0, 1, 1], [1, 1, 0]]   # Z
+]
+
+class PieceState:
+    """Одно положение (поворот) фигуры со всеми производными данными для столкновений"""
+    __slots__ = ('shape', 'cells', 'width', 'height', 'bottom', 'masks')
+
+    def __init__(self, shape):
+        self.shape = shape
+        # Смещения занятых клеток (строка, столбец) относительно левого верхнего угла
+        self.cells = tuple((i, j) for i, row in enumerate(shape)
+                           for j, cell in enumerate(row) if cell)
+        self.width = len(shape[0])
+        self.height = len(shape)
+        # Нижний профиль: самая нижняя занятая строка в каждом столбце
+        self.bottom = tuple(max(i for i, j in self.cells if j == column)
+                            for column in range(self.width))
+        # Битовые маски строк: бит j установлен, если занят столбец j
+        self.masks = tuple(sum(1 << j for j, cell in enumerate(row) if cell) for row in shape)
+
+def build_piece_table(shapes):
+    """Все различные повороты каждой фигуры по часовой стрелке, начиная с исходного"""
+    table = []
+    for shape in shapes:
+        states = []
+        current = tuple(map(tuple, shape))
+        while all(state.shape != current for state in states):
+            states.append(PieceState(current))
+            current = tuple(zip(*current[::-1]))
+        table.append(tuple(states))
+    return tuple(table)
+
+# Таблица фигур: PIECES[id][поворот], строится один раз при импорте
+PIECES = build_piece_table(SHAPES)
+# Поле меньше не бывает: в него должна помещаться любая фигура в любом повороте
+MIN_WIDTH = max(state.width for states in PIECES for state in states)
+MIN_HEIGHT = max(state.height for states in PIECES for state in states)
+
+def piece_state(piece):
+    """Текущее положение фигуры из таблицы PIECES"""
+    return PIECES[piece['id']][piece['rotation']]
+
+def stack_landing(heights, height, state, x, y):
+    """Строка приземления по высотам столбцов за один проход по столбцам фигуры.
+
+    Верно, только если фигура целиком выше верхушек своих столбцов; иначе (фигура
+    задвинута под навес) возвращает None и строку нужно искать перебором."""
+    landing = height
+    for j, bottom in enumerate(state.bottom):
+        top = height - heights[x + j]  # Верхний занятый ряд столбца (height, если столбец пуст)
+        if y + bottom >= top:
+            return None
+        landing = min(landing, top - 1 - bottom)
+    return landing
+
+def join_chunks(chunks, count):
+    """Первые count строк кусков chunks одним списком"""
+    rows = []
+    for chunk in chunks:
+        rows += chunk
+    del rows[count:]
+    return rows
+
+class Board:
+    """Игровое поле: каждая строка — битовая маска, цвета хранятся в параллельной плоскости.
+
+    Строки хранятся снизу вверх и только до верхушки стопки: пустое место над блоками
+    ничего не стоит, поэтому поле может быть очень высоким. Номера строк в методах
+    считаются сверху, как на экране. Хранимые строки разбиты на куски по CHUNK_ROWS:
+    снимок поля делит куски с самим полем, а первая запись после снимка копирует
+    только тот кусок, в который пишет."""
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT):
+        self.width = width
+        self.height = height
+        self.full_row = (1 << width) - 1  # Маска полностью заполненной строки
+        # Маски строк от дна кусками: строка height - 1 - k лежит в stack[k >> CHUNK_BITS][k & CHUNK_MASK]
+        self.stack = []
+        self.colors = []  # Цвета клеток тех же строк такими же кусками, для отрисовки
+        self.size = 0  # Число хранимых строк; хвост последнего куска пустой
+        self.full = set()  # Номера от дна заполненных строк, их снимет clear_lines
+        self.empty_colors = (0,) * width  # Строка цветов для всего, что выше стопки
+        # Индекс поверхности: высота каждого столбца от дна до верхнего блока и число блоков
+        self.heights = [0] * width
+        self.filled = 0
+        self.revision = 0  # Растет при каждом изменении клеток, по нему видно, что поле не менялось
+        self.shared = False  # Списки кусков и высот общие со снимком, перед изменением их копируем
+        self.owned = set()  # Куски, которых нет ни в одном снимке: их можно менять на месте
+
+    @property
+    def top(self):
+        """Верхняя хранимая строка, выше нее поле пустое"""
+        return self.height - self.size
+
+    def row(self, i):
+        """Маска строки i"""
+        k = self.height - 1 - i
+        return self.stack[k >> CHUNK_BITS][k & CHUNK_MASK] if k < self.size else 0
+
+    def row_colors(self, i):
+        """Цвета клеток строки i"""
+        k = self.height - 1 - i
+        return self.colors[k >> CHUNK_BITS][k & CHUNK_MASK] if k < self.size else self.empty_colors
+
+    def stored_rows(self, top=0, bottom=None):
+        """(номер, маска, цвета) хранимых строк из [top, bottom) сверху вниз, пустые сверху пропускаются"""
+        height = self.height
+        bottom = height if bottom is None else min(bottom, height)
+        for i in range(max(top, height - self.size), bottom):
+            k = height - 1 - i
+            yield i, self.stack[k >> CHUNK_BITS][k & CHUNK_MASK], self.colors[k >> CHUNK_BITS][k & CHUNK_MASK]
+
+    def masks(self):
+        """Маски всех строк сверху вниз одним списком (для поиска бота)"""
+        rows = join_chunks(self.stack, self.size)
+        rows.reverse()
+        return [0] * self.top + rows
+
+    def snapshot(self):
+        """Снимок клеток за O(1): куски делятся со снимком до первой записи в них"""
+        self.shared = True
+        return self.stack, self.colors, self.size, self.heights, self.filled, self.full
+
+    def restore(self, snapshot):
+        """Возврат к снимку за O(1), снимок остается пригодным для следующих возвратов"""
+        self.stack, self.colors, self.size, self.heights, self.filled, self.full = snapshot
+        self.shared = True
+        self.revision += 1
+
+    def unshare(self):
+        # Копируются списки ссылок на куски (size / CHUNK_ROWS), высоты и полные строки;
+        # сами куски остаются общими, пока в них не пишут (см. writable)
+        if self.shared:
+            self.stack = list(self.stack)
+            self.colors = list(self.colors)
+            self.heights = list(self.heights)
+            self.full = set(self.full)
+            self.owned = set()
+            self.shared = False
+
+    def writable(self, k):
+        """Куски масок и цветов со строкой k, которые можно менять на месте; нужен unshare() раньше"""
+        chunk = k >> CHUNK_BITS
+        if chunk not in self.owned:
+            self.stack[chunk] = list(self.stack[chunk])
+            self.colors[chunk] = list(self.colors[chunk])
+            self.owned.add(chunk)
+        return self.stack[chunk], self.colors[chunk]
+
+    def grow(self, count):
+        """Хранимых строк не меньше count: недостающие пустые добавляются сверху стопки"""
+        if count > self.size:
+            while len(self.stack) << CHUNK_BITS < count:
+                self.owned.add(len(self.stack))
+                self.stack.append([0] * CHUNK_ROWS)
+                self.colors.append([self.empty_colors] * CHUNK_ROWS)
+            self.size = count
+
+    def rows_from(self, chunk):
+        """Маски и цвета хранимых строк от начала куска chunk и выше двумя списками"""
+        count = self.size - (chunk << CHUNK_BITS)
+        return join_chunks(self.stack[chunk:], count), join_chunks(self.colors[chunk:], count)
+
+    def store_from(self, chunk, masks, colors):
+        """Строки от начала куска chunk заменяются строками masks и colors; куски нарезаются заново.
+
+        Списки masks и colors дополняются пустыми строками до целого куска на месте."""
+        self.size = (chunk << CHUNK_BITS) + len(masks)
+        padding = -len(masks) % CHUNK_ROWS
+        masks += [0] * padding
+        colors += [self.empty_colors] * padding
+        self.stack[chunk:] = [masks[j:j + CHUNK_ROWS] for j in range(0, len(masks), CHUNK_ROWS)]
+        self.colors[chunk:] = [colors[j:j + CHUNK_ROWS] for j in range(0, len(colors), CHUNK_ROWS)]
+        self.owned = {n for n in self.owned if n < chunk}
+        self.owned.update(range(chunk, len(self.stack)))
+
+    def set_row(self, i, mask, colors):
+        """Прямая запись строки (восстановление состояния); после нее нужен rebuild_index"""
+        self.unshare()
+        k = self.height - 1 - i
+        if k >= self.size:
+            if not mask:
+                return
+            self.grow(k + 1)
+        masks, chunk_colors = self.writable(k)
+        masks[k & CHUNK_MASK] = mask
+        # Хвост кусков над стопкой всегда пустой: у пустой строки и цвета пустые
+        chunk_colors[k & CHUNK_MASK] = tuple(colors) if mask else self.empty_colors
+
+    def collides(self, masks, x, y):
+        """Пересекается ли фигура с масками строк masks в позиции (x, y) со стенами или блоками"""
+        stack = self.stack
+        for i, mask in enumerate(masks):
+            if not mask:
+                continue
+            if x >= 0:
+                mask <<= x
+            elif mask & ((1 << -x) - 1):
+                return True  # Выход за левую границу
+            else:
+                mask >>= -x
+            if mask > self.full_row:
+                return True  # Выход за правую границу
+            row = y + i
+            if row >= self.height:
+                return True
+            k = self.height - 1 - row  # Для строк выше поля k >= height, там блоков нет
+            if k < self.size and stack[k >> CHUNK_BITS][k & CHUNK_MASK] & mask:
+                return True
+        return False
+
+    def place(self, masks, x, y, color):
+        """Фиксация фигуры на поле"""
+        self.unshare()
+        heights = self.heights
+        for i, mask in enumerate(masks):
+            k = self.height - 1 - (y + i)
+            if k >= self.size:
+                self.grow(k + 1)
+            chunk_masks, chunk_colors = self.writable(k)
+            r = k & CHUNK_MASK
+            chunk_masks[r] |= mask << x
+            if chunk_masks[r] == self.full_row:
+                self.full.add(k)
+            colors = list(chunk_colors[r])
+            j = 0
+            while mask:
+                if mask & 1:
+                    colors[x + j] = color
+                    heights[x + j] = max(heights[x + j], k + 1)
+                    self.filled += 1
+                mask >>= 1
+                j += 1
+            chunk_colors[r] = tuple(colors)
+        self.revision += 1
+
+    def clear_lines(self):
+        """Удаление заполненных строк, возвращает их количество.
+
+        Полные строки известны после place, поэтому работа зависит от числа очищенных
+        строк, ширины поля и числа строк над нижней из них, но не от высоты поля:
+        заново нарезаются только куски от нижней очищенной строки до верхушки стопки."""
+        if not self.full:
+            return 0
+        self.unshare()
+        cleared = len(self.full)
+        chunk = min(self.full) >> CHUNK_BITS
+        start = chunk << CHUNK_BITS
+        masks, colors = self.rows_from(chunk)
+        for k in sorted(self.full, reverse=True):
+            del masks[k - start]
+            del colors[k - start]
+        self.store_from(chunk, masks, colors)
+        self.full = set()
+
+        # Полные строки лежат под верхушкой любого столбца, поэтому высоты падают на cleared;
+        # если верхний блок столбца был в очищенной строке, опускаемся до следующего блока
+        self.filled -= cleared * self.width
+        stack = self.stack
+        for j, height in enumerate(self.heights):
+            height -= cleared
+            while height and not stack[(height - 1) >> CHUNK_BITS][(height - 1) & CHUNK_MASK] >> j & 1:
+                height -= 1
+            self.heights[j] = height
+        self.trim()
+        self.revision += 1
+        return cleared
+
+    def trim(self):
+        # Пустые строки на верху стопки не храним, лишние пустые куски отбрасываем
+        while self.size and not self.row(self.top):
+            self.size -= 1
+        while len(self.stack) << CHUNK_BITS >= self.size + CHUNK_ROWS:
+            self.stack.pop()
+            self.colors.pop()
+            self.owned.discard(len(self.stack))
+
+    def add_garbage(self, count, hole, color=GARBAGE_COLOR):
+        """count мусорных строк снизу с дырой в столбце hole, поле сдвигается вверх.
+
+        Возвращает True, если блоки вытеснены за верх поля."""
+        self.unshare()
+        count = min(count, self.height)
+        overflow = self.size + count > self.height
+        row = self.full_row & ~(1 << hole)
+        masks, colors = self.rows_from(0)
+        masks[:0] = [row] * count
+        colors[:0] = [tuple(0 if j == hole else color for j in range(self.width))] * count
+        self.store_from(0, masks[:self.height], colors[:self.height])
+        if overflow:
+            self.rebuild_index()
+        else:
+            self.filled += count * (self.width - 1)
+            self.heights = [height + count if height or j != hole else 0
+                            for j, height in enumerate(self.heights)]
+            self.full = {k + count for k in self.full}
+        self.revision += 1
+        return overflow
+
+    def rebuild_index(self):
+        """Пересчет высот столбцов и полных строк после прямой записи строк (восстановление состояния)"""
+        self.unshare()
+        self.revision += 1
+        self.trim()
+        self.heights = [0] * self.width
+        self.filled = 0
+        self.full = set()
+        remaining = self.full_row  # Столбцы, верхний блок которых еще не найден
+        masks = self.rows_from(0)[0]
+        for k in range(len(masks) - 1, -1, -1):
+            mask = masks[k]
+            self.filled += bin(mask).count('1')
+            if mask == self.full_row:
+                self.full.add(k)
+            found = mask & remaining
+            if found:
+                remaining &= ~found
+                for j in range(self.width):
+                    if found >> j & 1:
+                        self.heights[j] = k + 1
+
+    def landing_y(self, state, x, y):
+        """Строка, на которой остановится фигура state, падающая из (x, y)"""
+        landing = stack_landing(self.heights, self.height, state, x, y)
+        if landing is not None:
+            return landing
+        while not self.collides(state.masks, x, y + 1):
+            y += 1
+        return y
+
+    def above_stack(self, state, x, y):
+        """Фигура целиком выше верхушек своих столбцов, то есть точно ни с чем не пересекается"""
+        return all(y + bottom < self.height - self.heights[x + j]
+                   for j, bottom in enumerate(state.bottom))
+
+    # Сводные показатели поверхности для ботов и аналитики, берутся из индекса высот
+
+    def aggregate_height(self):
+        return sum(self.heights)
+
+    def max_height(self):
+        return max(self.heights)
+
+    def holes(self):
+        """Пустые клетки под верхушками столбцов"""
+        return sum(self.heights) - self.filled
+
+    def bumpiness(self):
+        """Сумма перепадов высот соседних столбцов"""
+        heights = self.heights
+        return sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+
+class Statistics:
+    def __init__(self):
+        self.total_lines = 0
+        self.total_score = 0
+        self.max_level = 1
+        self.games_played = 0
+        self.best_score = 0
+        self.achievements = {
+            'first_line': {'name': 'Первая линия', 'achieved': False},
+            'level_5': {'name': 'Уровень 5', 'achieved': False},
+            'score_1000': {'name': 'Счет 1000', 'achieved': False},
+            'score_5000': {'name': 'Счет 5000', 'achieved': False},
+            'lines_50': {'name': '50 линий', 'achieved': False}
+        }
+
+    def update(self, lines, score, level):
+        self.total_lines += lines
+        self.total_score += score
+        self.max_level = max(self.max_level, level)
+        self.best_score = max(self.best_score, score)
+        
+        # Проверка достижений
+        if lines > 0 and not self.achievements['first_line']['achieved']:
+            self.achievements['first_line']['achieved'] = True
+        if level >= 5 and not self.achievements['level_5']['achieved']:
+            self.achievements['level_5']['achieved'] = True
+        if score >= 1000 and not self.achievements['score_1000']['achieved']:
+            self.achievements['score_1000']['achieved'] = True
+        if score >= 5000 and not self.achievements['score_5000']['achieved']:
+            self.achievements['score_5000']['achieved'] = True
+        if self.total_lines >= 50 and not self.achievements['lines_50']['achieved']:
+            self.achievements['lines_50']['achieved'] = True
+
+    def merge(self, other):
+        """Добавление статистики других партий, например сыгранных в другом процессе"""
+        self.total_lines += other.total_lines
+        self.total_score += other.total_score
+        self.max_level = max(self.max_level, other.max_level)
+        self.games_played += other.games_played
+        self.best_score = max(self.best_score, other.best_score)
+        for key, achievement in other.achievements.items():
+            if achievement['achieved']:
+                self.achievements[key]['achieved'] = True
+        if self.total_lines >= 50:
+            self.achievements['lines_50']['achieved'] = True
+
+# Действия игрока для Engine.step, Engine.press и Engine.release
+LEFT = 'left'
+RIGHT = 'right'
+DOWN = 'down'
+ROTATE = 'rotate'
+DROP = 'drop'
+
+# Смещения для движений, которые повторяются при удержании клавиши
+HELD_MOVES = {
+    LEFT: (-1, 0),
+    RIGHT: (1, 0),
+    DOWN: (0, 1),
+}
+DAS_MS = 170  # Задержка перед автоповтором сдвига при удержании клавиши (DAS), мс
+ARR_MS = 50  # Период автоповтора сдвига (ARR), мс; 0 — сразу до упора
+SOFT_DROP_MS = 50  # Период повтора мягкого падения (вниз), без задержки перед первым повтором
+
+class Snapshot:
+    """Неизменяемый снимок партии: поле, фигуры, счет, уровень и позиция в последовательности фигур.
+
+    Куски строк поля общие с движком, поэтому снимок занимает память только под куски,
+    измененные после него. Статистика игрока и игровое время в снимок не входят."""
+    __slots__ = ('board', 'current_piece', 'next_piece', 'score', 'level', 'lines_cleared_total',
+                 'fall_time', 'fall_speed', 'game_over', 'pieces_drawn', 'pending_garbage',
+                 'outgoing_garbage')
+
+    def __init__(self, engine):
+        self.board = engine.board.snapshot()
+        self.current_piece = dict(engine.current_piece)
+        self.next_piece = dict(engine.next_piece)
+        self.score = engine.score
+        self.level = engine.level
+        self.lines_cleared_total = engine.lines_cleared_total
+        self.fall_time = engine.fall_time
+        self.fall_speed = engine.fall_speed
+        self.game_over = engine.game_over
+        self.pieces_drawn = engine.pieces_drawn
+        self.pending_garbage = tuple(engine.pending_garbage)
+        self.outgoing_garbage = engine.outgoing_garbage
+
+class Engine:
+    """Состояние одной партии и правила игры; время задается извне через tick(ms)"""
+    def __init__(self, statistics=None, seed=None, width=GRID_WIDTH, height=GRID_HEIGHT, rewind_depth=0,
+                 das=DAS_MS, arr=ARR_MS):
+        if width < MIN_WIDTH or height < MIN_HEIGHT:
+            raise ValueError(f'Поле {width}x{height} меньше наименьшего {MIN_WIDTH}x{MIN_HEIGHT}')
+        self.width = width  # Размер поля задается на партию
+        self.height = height
+        self.statistics = statistics if statistics is not None else Statistics()
+        # Свой генератор на партию: по сиду последовательность фигур воспроизводится
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.rng = random.Random(self.seed)
+        # Журнал выданных генератором фигур (id, цвет): снимку достаточно номера в нем
+        self.sequence = []
+        self.pieces_drawn = 0  # Сколько фигур выдано, следующая берется из журнала по этому номеру
+        # Снимки на появлении последних фигур для отмены ходов (rewind_depth=0 — без отмены)
+        self.history = deque(maxlen=rewind_depth)
+        self.start = None  # Снимок начала партии для мгновенного повтора (retry)
+        self.elapsed = 0  # Игровое время в мс, сумма всех tick()
+        self.das = das
+        self.arr = arr
+        self.soft_drop = SOFT_DROP_MS
+        self.shift_on_press = True  # Записи до версии 4 шли без сдвига по нажатию (см. replay.py)
+        self.held = {action: False for action in HELD_MOVES}
+        self.move_time = {action: das for action in HELD_MOVES}  # Мс до следующего повтора
+        self.pending_garbage = []  # (строк, столбец дыры) от соперника, ждут следующей фиксации
+        self.outgoing_garbage = 0  # Мусорные строки для соперника, их забирает сервер (battle.py)
+        self.reset()
+
+    def reset(self):
+        self.board = Board(self.width, self.height)
+        self.current_piece = self.new_piece()
+        self.next_piece = self.new_piece()
+        self.game_over = False
+        self.score = 0
+        self.level = 1
+        self.lines_cleared_total = 0
+        self.fall_time = 0
+        self.fall_speed = self.calculate_level()
+        self.pending_garbage = []
+        self.outgoing_garbage = 0
+        self.start = Snapshot(self)
+        self.history.clear()
+        self.remember()
+
+    def snapshot(self):
+        """Снимок текущего состояния за O(1)"""
+        return Snapshot(self)
+
+    def restore(self, snapshot):
+        """Возврат к снимку за O(1); снимок не меняется, к нему можно вернуться снова"""
+        self.board.restore(snapshot.board)
+        self.current_piece = dict(snapshot.current_piece)
+        self.next_piece = dict(snapshot.next_piece)
+        self.score = snapshot.score
+        self.level = snapshot.level
+        self.lines_cleared_total = snapshot.lines_cleared_total
+        self.fall_time = snapshot.fall_time
+        self.fall_speed = snapshot.fall_speed
+        self.game_over = snapshot.game_over
+        self.pieces_drawn = snapshot.pieces_drawn
+        self.pending_garbage = list(snapshot.pending_garbage)
+        self.outgoing_garbage = snapshot.outgoing_garbage
+
+    def remember(self):
+        # Снимок на появлении фигуры, если отмена ходов включена
+        if self.history.maxlen:
+            self.history.append(Snapshot(self))
+
+    def rewind(self):
+        """Отмена последней поставленной фигуры: состояние на момент ее появления.
+
+        Без поставленных фигур в истории текущая фигура возвращается на старт. Законченную
+        партию отменить нельзя: она уже посчитана в статистике и сохранена в таблице рекордов."""
+        if not self.history or self.game_over:
+            return False
+        if len(self.history) > 1:
+            self.history.pop()
+        self.restore(self.history[-1])
+        return True
+
+    def retry(self):
+        """Мгновенный повтор партии с начала с той же последовательностью фигур"""
+        self.restore(self.start)
+        self.history.clear()
+        self.remember()
+
+    def new_piece(self):
+        # Создание новой фигуры; после отмены ходов фигуры снова берутся из журнала
+        self.extend_sequence(self.pieces_drawn + 1)
+        piece_id, color = self.sequence[self.pieces_drawn]
+        self.pieces_drawn += 1
+        return {
+            'id': piece_id,
+            'rotation': 0,
+            'color': color,
+            'x': self.board.width // 2 - PIECES[piece_id][0].width // 2,
+            'y': 0
+        }
+
+    def extend_sequence(self, count):
+        """Журнал фигур не короче count: недостающие фигуры дописывает генератор"""
+        while len(self.sequence) < count:
+            self.sequence.append((self.rng.randrange(len(PIECES)), self.rng.choice(COLORS)))
+
+    def rewind_rng(self, pieces_drawn):
+        """Выдача фигур с позиции pieces_drawn (восстановление состояния)"""
+        self.extend_sequence(pieces_drawn)
+        self.pieces_drawn = pieces_drawn
+
+    def valid_move(self, piece, x, y):
+        # Проверка возможности движения
+        return not self.board.collides(PIECES[piece['id']][piece['rotation']].masks, x, y)
+
+    def merge_piece(self):
+        # Добавление фигуры в сетку
+        self.board.place(piece_state(self.current_piece).masks, self.current_piece['x'],
+                         self.current_piece['y'], self.current_piece['color'])
+
+    def remove_complete_lines(self):
+        # Находим и удаляем заполненные линии
+        lines_cleared = self.board.clear_lines()
+        
+        if lines_cleared > 0:
+            self.statistics.update(lines_cleared, self.score, self.level)
+        
+        return lines_cleared
+
+    def rotate_piece(self):
+        # Поворот фигуры
+        states = PIECES[self.current_piece['id']]
+        rotation = (self.current_piece['rotation'] + 1) % len(states)
+        if not self.board.collides(states[rotation].masks,
+                                   self.current_piece['x'], self.current_piece['y']):
+            self.current_piece['rotation'] = rotation
+
+    def calculate_level(self):
+        # Повышаем уровень каждые 10 линий
+        self.level = (self.lines_cleared_total // 10) + 1
+        return max(50, 250 - (self.level - 1) * 20)  # Уменьшаем задержку падения с каждым уровнем
+
+    def drop_piece(self):
+        # Мгновенный сброс фигуры вниз
+        landing = self.landing_y(self.current_piece)
+        drop_distance = landing - self.current_piece['y']
+        self.current_piece['y'] = landing
+        return drop_distance
+
+    def landing_y(self, piece):
+        """Строка, на которой фигура остановится при падении"""
+        return self.board.landing_y(piece_state(piece), piece['x'], piece['y'])
+
+    def move(self, dx, dy):
+        """Сдвиг текущей фигуры, если он возможен"""
+        piece = self.current_piece
+        if self.valid_move(piece, piece['x'] + dx, piece['y'] + dy):
+            piece['x'] += dx
+            piece['y'] += dy
+            return True
+        return False
+
+    def receive_garbage(self, count, hole):
+        """Мусор от соперника: поднимется снизу при следующей фиксации без очищенных линий"""
+        self.pending_garbage.append((count, hole))
+
+    def exchange_garbage(self, lines_cleared):
+        """Очищенные линии сначала гасят входящий мусор, остаток уходит сопернику.
+
+        Возвращает True, если поднятый мусор вытеснил блоки за верх поля."""
+        attack = GARBAGE_LINES[min(lines_cleared, len(GARBAGE_LINES) - 1)]
+        while attack and self.pending_garbage:
+            count, hole = self.pending_garbage[0]
+            cancelled = min(attack, count)
+            attack -= cancelled
+            if cancelled == count:
+                self.pending_garbage.pop(0)
+            else:
+                self.pending_garbage[0] = (count - cancelled, hole)
+        self.outgoing_garbage += attack
+
+        overflow = False
+        if not lines_cleared:
+            for count, hole in self.pending_garbage:
+                overflow |= self.board.add_garbage(count, hole)
+            self.pending_garbage = []
+        return overflow
+
+    def lock_piece(self):
+        """Фиксация фигуры: очистка линий, очки, уровень и выдача следующей фигуры"""
+        self.merge_piece()
+        lines_cleared = self.remove_complete_lines()
+        self.lines_cleared_total += lines_cleared
+        self.score += lines_cleared * 100 * self.level
+        self.fall_speed = self.calculate_level()
+        topped_out = self.exchange_garbage(lines_cleared)
+        self.current_piece = self.next_piece
+        self.next_piece = self.new_piece()
+        
+        # Обычно новая фигура над стопкой, и полная проверка столкновений не нужна
+        piece = self.current_piece
+        state = piece_state(piece)
+        if topped_out or (not self.board.above_stack(state, piece['x'], piece['y'])
+                          and self.board.collides(state.masks, piece['x'], piece['y'])):
+            self.game_over = True
+            self.statistics.games_played += 1
+        self.remember()
+        return lines_cleared
+
+    def step(self, action):
+        """Мгновенное действие игрока, возвращает начисленные за него очки"""
+        if self.game_over:
+            return 0
+        if action == DROP:
+            reward = self.drop_piece() * 2
+            self.score += reward
+            return reward
+        if action == ROTATE:
+            self.rotate_piece()
+        elif action in HELD_MOVES:
+            self.move(*HELD_MOVES[action])
+        return 0
+
+    def press(self, action):
+        # Сдвиг сразу по нажатию, дальше повтор в tick(): вбок после задержки DAS и каждые ARR мс
+        self.held[action] = True
+        if self.shift_on_press:
+            self.move_time[action] = self.soft_drop if action == DOWN else self.das
+            if not self.game_over:
+                self.move(*HELD_MOVES[action])
+
+    def release(self, action):
+        self.held[action] = False
+
+    def tick(self, ms):
+        """Продвижение игры на ms миллисекунд, возвращает начисленные очки"""
+        self.elapsed += ms
+        if self.game_over:
+            return 0
+        score = self.score
+        self.fall_time += ms
+
+        # Обработка движения
+        for action, (dx, dy) in HELD_MOVES.items():
+            if self.held[action]:
+                self.repeat(action, dx, dy, ms)
+
+        if self.fall_time >= self.fall_speed:
+            if not self.move(0, 1):
+                self.lock_piece()
+            self.fall_time = 0
+        return self.score - score
+
+    def repeat(self, action, dx, dy, ms):
+        """Повторы зажатого движения за ms миллисекунд"""
+        period = self.soft_drop if action == DOWN else self.arr
+        left = self.move_time[action] - ms
+        if period == 0:
+            if left <= 0:
+                while self.move(dx, dy):
+                    pass
+                left = 0
+        else:
+            while left <= 0:
+                self.move(dx, dy)
+                left += period
+        self.move_time[action] = left
+
+    def advance(self, ms, step):
+        """То же, что ms // step вызовов tick(step), но шаги без событий пропускаются разом"""
+        steps = ms // step
+        while steps > 0:
+            if self.game_over:
+                idle = steps
+            elif any(self.held.values()):
+                idle = 0
+            else:
+                # Без зажатых клавиш шаг только копит fall_time, пока не наступит падение
+                idle = min(steps, max(0, -(-(self.fall_speed - self.fall_time) // step) - 1))
+                self.fall_time += idle * step
+            self.elapsed += idle * step
+            steps -= idle
+            if steps:
+                self.tick(step)
+                steps -= 1
@@ -0,0 +1,169 @@
+import argparse
+import multiprocessing
+import os
+import struct
+import sys
+import time
+import zlib
+from collections import deque
+
+# Без дисплея: pygame должен увидеть драйвер до импорта tetris. Свои обработчики сигналов SDL
+# превращают SIGTERM в событие выхода, и процессы пула не завершались бы по terminate().
+# Приветствие pygame при импорте попало бы в поток кадров для ffmpeg (--out -)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_NO_SIGNAL_HANDLERS', '1')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from replay import Replay
+
+# Экспорт записи партии в кадры без дисплея: PNG-файлы или сырой поток RGB, например для ffmpeg:
+#   python export.py game.trpl --format raw --out - | \
+#       ffmpeg -f rawvideo -pix_fmt rgb24 -s 1280x720 -r 30 -i - game.mp4
+# Кадры рисует тот же Tetris.draw, что и в игре, только в поверхность в памяти.
+# Кадры делятся на порции, порции рисуются в пуле процессов и пишутся строго по порядку.
+
+DEFAULT_SIZE = (1280, 720)
+DEFAULT_FPS = 30
+CHUNK_FRAMES = 32  # Кадров в одной порции: внутри порции кадры рисуются инкрементально
+AHEAD = 2  # Порций в работе на процесс; ограничивает память под готовые, но не записанные кадры
+PNG_LEVEL = 1  # Сжатие zlib: кадры игры почти однотонные, сильнее сжимать дольше и почти без выигрыша
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+FORMATS = ('png', 'raw')
+
+# Состояние процесса пула: запись и игра с поверхностью в памяти создаются один раз на процесс
+worker = {}
+
+def init_worker(data, size, image_format, level=PNG_LEVEL):
+    import tetris
+    replay = Replay(data)
+    worker['replay'] = replay
+    worker['format'] = image_format
+    worker['level'] = level
+    worker['game'] = tetris.Tetris(seed=replay.seed, screen_size=size,
+                                   board_size=(replay.width, replay.height), offscreen=True)
+
+def frame_times(start, end, fps):
+    """Моменты кадров в мс игрового времени от start до end включительно"""
+    count = int((end - start) * fps / 1000) + 1
+    return [start + round(k * 1000 / fps) for k in range(count)]
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def encode_png(rgb, width, height, level=PNG_LEVEL):
+    """PNG из строк RGB без фильтров строк; pygame.image.save сжимает кадр в несколько раз дольше"""
+    stride = width * 3
+    rows = b''.join(b'\x00' + rgb[i:i + stride] for i in range(0, len(rgb), stride))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)  # 8 бит на канал, RGB
+    return (PNG_SIGNATURE + png_chunk(b'IHDR', header)
+            + png_chunk(b'IDAT', zlib.compress(rows, level)) + png_chunk(b'IEND', b''))
+
+def encode_frame(surface, image_format, level=PNG_LEVEL):
+    """Кадр в байты: PNG целиком или строки пикселей RGB"""
+    import pygame
+    rgb = pygame.image.tobytes(surface, 'RGB')
+    if image_format == 'raw':
+        return rgb
+    return encode_png(rgb, *surface.get_size(), level)
+
+def render_chunk(times):
+    """Кадры порции: перемотка к первому моменту, дальше пересимуляция и отрисовка изменений"""
+    game = worker['game']
+    game.last_frame = None  # Первый кадр порции рисуется целиком
+    frames = []
+    for engine in worker['replay'].states(times):
+        game.engine = engine
+        game.draw()
+        frames.append(encode_frame(game.screen, worker['format'], worker['level']))
+    return frames
+
+class PngWriter:
+    """Кадры в каталог: frame_000000.png, frame_000001.png, ..."""
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.count = 0
+
+    def write(self, frame):
+        with open(os.path.join(self.directory, f'frame_{self.count:06d}.png'), 'wb') as f:
+            f.write(frame)
+        self.count += 1
+
+    def close(self):
+        pass
+
+class RawWriter:
+    """Сырые кадры RGB подряд в файл или в stdout ('-')"""
+    def __init__(self, path):
+        self.stream = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        self.count = 0
+
+    def write(self, frame):
+        self.stream.write(frame)
+        self.count += 1
+
+    def close(self):
+        self.stream.flush()
+        if self.stream is not sys.stdout.buffer:
+            self.stream.close()
+
+def export(data, writer, size=DEFAULT_SIZE, fps=DEFAULT_FPS, start=0, end=None, image_format='png',
+           workers=None, chunk_frames=CHUNK_FRAMES, level=PNG_LEVEL):
+    """Кадры записи data в writer по порядку, возвращает (кадров, секунд)"""
+    end = Replay(data).duration if end is None else end
+    times = frame_times(start, end, fps)
+    chunks = [times[i:i + chunk_frames] for i in range(0, len(times), chunk_frames)]
+    workers = workers or os.cpu_count() or 1
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(workers, init_worker, (data, size, image_format, level)) as pool:
+        # Готовые порции ждут своей очереди на запись, но вперед уходит не больше AHEAD на процесс
+        pending = deque()
+        queued = iter(chunks)
+        for chunk in queued:
+            pending.append(pool.apply_async(render_chunk, (chunk,)))
+            if len(pending) >= workers * AHEAD:
+                break
+        while pending:
+            for frame in pending.popleft().get():
+                writer.write(frame)
+            chunk = next(queued, None)
+            if chunk is not None:
+                pending.append(pool.apply_async(render_chunk, (chunk,)))
+        pool.close()
+        pool.join()
+    writer.close()
+    return len(times), time.perf_counter() - started
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description='Экспорт записи партии в кадры без дисплея')
+    parser.add_argument('path', help='Файл записи (см. replay.py)')
+    parser.add_argument('--out', required=True,
+                        help='Каталог для PNG или файл сырого потока (- для stdout)')
+    parser.add_argument('--format', choices=FORMATS, default='png', help='PNG-файлы или сырой RGB')
+    parser.add_argument('--size', type=parse_size, default=DEFAULT_SIZE, help='Разрешение, например 1920x1080')
+    parser.add_argument('--fps', type=float, default=DEFAULT_FPS, help='Кадров в секунду')
+    parser.add_argument('--start', type=int, default=0, help='Начало отрывка, мс игрового времени')
+    parser.add_argument('--end', type=int, default=None, help='Конец отрывка, мс (по умолчанию до конца)')
+    parser.add_argument('--workers', type=int, default=None, help='Процессов (по умолчанию по числу ядер)')
+    parser.add_argument('--chunk', type=int, default=CHUNK_FRAMES, help='Кадров в одной порции')
+    parser.add_argument('--level', type=int, default=PNG_LEVEL, help='Сжатие PNG, 0-9')
+    args = parser.parse_args()
+
+    with open(args.path, 'rb') as f:
+        data = f.read()
+    writer = PngWriter(args.out) if args.format == 'png' else RawWriter(args.out)
+    workers = args.workers or os.cpu_count() or 1
+    frames, elapsed = export(data, writer, args.size, args.fps, args.start, args.end, args.format,
+                             workers, args.chunk, args.level)
+    # Сводка в stderr: stdout может быть занят кадрами
+    print(f'Кадров: {frames} за {elapsed:.2f} с, {frames / elapsed:.1f} кадр/с, '
+          f'{frames / elapsed / workers:.1f} кадр/с на процесс', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
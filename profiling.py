@@ -0,0 +1,160 @@
+import csv
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Замеры фаз кадра: ввод, симуляция, этапы отрисовки. Хранится окно последних кадров,
+# по нему считаются перцентили; те же данные выгружаются в CSV или JSON.
+# Отдельно меряется задержка ввода: от события клавиши до показа кадра с его результатом.
+
+def percentile(samples, q):
+    """q-й перцентиль выборки (ближайшее значение снизу); 0.0 для пустой"""
+    values = sorted(samples)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+class FrameProfiler:
+    """Время фаз каждого кадра и счетчики отрисовки за последние window кадров"""
+    def __init__(self, window=600):
+        self.frames = deque(maxlen=window)
+        self.phases = []  # Порядок фаз, как они встречались
+        self.current = None
+        self.last_mark = 0.0
+        self.frame_started = 0.0
+
+    def begin_frame(self):
+        now = time.perf_counter()
+        self.current = {}
+        if self.frame_started:
+            # Полный период кадра вместе с ожиданием, по нему считается FPS
+            self.current['interval'] = (now - self.frame_started) * 1000
+        self.frame_started = self.last_mark = now
+
+    def mark(self, phase):
+        """Время с предыдущей отметки записывается в фазу phase"""
+        if self.current is None:
+            return
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + (now - self.last_mark) * 1000
+        self.last_mark = now
+        if phase not in self.phases:
+            self.phases.append(phase)
+
+    def count(self, name, amount=1):
+        """Счетчик кадра, например число блитов или обновленных областей экрана"""
+        if self.current is not None:
+            key = '#' + name
+            self.current[key] = self.current.get(key, 0) + amount
+
+    def end_frame(self):
+        if self.current is None:
+            return
+        # Время работы кадра без ожидания следующего
+        self.current['frame'] = (time.perf_counter() - self.frame_started) * 1000
+        self.frames.append(self.current)
+        self.current = None
+
+    def percentile(self, name, q):
+        return percentile((frame.get(name, 0) for frame in self.frames), q)
+
+    def fps(self):
+        """Средняя частота кадров по окну"""
+        intervals = [frame['interval'] for frame in self.frames if 'interval' in frame]
+        return len(intervals) * 1000 / sum(intervals) if intervals else 0.0
+
+    def columns(self):
+        counters = sorted({key for frame in self.frames for key in frame if key.startswith('#')})
+        return self.phases + ['frame', 'interval'] + counters
+
+    def summary(self):
+        """Сводка по окну: для каждой фазы и счетчика p50, p90, p99, среднее и максимум"""
+        result = {}
+        for name in self.columns():
+            values = [frame.get(name, 0) for frame in self.frames]
+            result[name] = {
+                'p50': self.percentile(name, 50),
+                'p90': self.percentile(name, 90),
+                'p99': self.percentile(name, 99),
+                'mean': sum(values) / len(values) if values else 0.0,
+                'max': max(values, default=0.0),
+            }
+        return result
+
+    def export(self, path):
+        """Выгрузка окна кадров: .json — сводка и сырые кадры, иначе CSV по кадру в строке"""
+        columns = self.columns()
+        if path.endswith('.json'):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'fps': self.fps(), 'summary': self.summary(),
+                           'frames': [[frame.get(name, 0) for name in columns] for frame in self.frames],
+                           'columns': columns}, f, indent=1)
+            return
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['index'] + columns)
+            for index, frame in enumerate(self.frames):
+                writer.writerow([index] + [round(frame.get(name, 0), 4) for name in columns])
+
+class LatencyMeter:
+    """Задержка от события ввода до показа кадра с его результатом за последние window событий"""
+    def __init__(self, window=600):
+        self.samples = deque(maxlen=window)
+        self.waiting = []  # Метки времени примененных событий, кадр с которыми еще не показан
+
+    def applied(self, timestamp):
+        self.waiting.append(timestamp)
+
+    def presented(self, now):
+        """Кадр показан в момент now: задержка записывается для всех ждавших событий"""
+        self.samples.extend(now - timestamp for timestamp in self.waiting)
+        self.waiting.clear()
+
+    def percentile(self, q):
+        return percentile(self.samples, q)
+
+    def summary(self):
+        """Сводка по окну: число событий, p50, p90, p99, среднее и максимум в мс"""
+        return {
+            'count': len(self.samples),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'mean': sum(self.samples) / len(self.samples) if self.samples else 0.0,
+            'max': max(self.samples, default=0.0),
+        }
+
+class StartupTimer:
+    """Время этапов запуска от импорта до первого показанного кадра"""
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+        self.phases = []  # (этап, мс) в порядке выполнения
+        self.deferred = []  # Этапы, отложенные на потом и замеренные отдельно
+        self.finished = False
+
+    def mark(self, phase):
+        """Время с предыдущей отметки записывается в этап phase"""
+        if self.finished:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000))
+        self.last = now
+
+    def finish(self, phase='first frame'):
+        """Первый кадр на экране: последняя отметка, дальше mark ничего не пишет"""
+        if not self.finished:
+            self.mark(phase)
+            self.finished = True
+
+    @contextmanager
+    def measure(self, phase):
+        started = time.perf_counter()
+        yield
+        self.deferred.append((phase, (time.perf_counter() - started) * 1000))
+
+    def report(self):
+        lines = [f'{phase:15} {ms:8.1f} мс' for phase, ms in self.phases]
+        lines.append(f"{'до первого кадра':15} {(self.last - self.started) * 1000:8.1f} мс")
+        lines += [f'{phase:15} {ms:8.1f} мс (отложено)' for phase, ms in self.deferred]
+        return '\n'.join(lines)
@@ -0,0 +1,356 @@
+import argparse
+import bisect
+import time
+
+from engine import (GRID_WIDTH, GRID_HEIGHT, DAS_MS, ARR_MS, Engine, Board, Statistics, COLORS,
+                    CELL_COLORS, LEFT, RIGHT, DOWN, ROTATE, DROP)
+
+# Запись партии: сид генератора и поток событий ввода с игровым временем.
+# Формат компактный: каждое событие — одно varint-число (dt << 4 | код),
+# раз в несколько секунд добавляется ключевой кадр с полным состоянием для перемотки.
+# Версия 2: в заголовке после шага симуляции записан размер поля. Версия 3: событие RESTORE.
+# Версия 4: сдвиг по нажатию и автоповтор DAS/ARR, их значения записаны в заголовке после размера поля.
+# Версия 5: статистика игрока в конце заголовка и каждого состояния: от нее зависит панель рекордов.
+# Версия 6: в состоянии только строки от верха стопки, перед ними номер верхней строки.
+
+MAGIC = b'TRPL'
+VERSION = 6
+LEGACY_REPEAT_MS = 100  # До версии 4 все движения повторялись раз в 100 мс и без сдвига по нажатию
+KEYFRAME_INTERVAL_MS = 10000
+
+# Коды событий ввода
+PRESS_LEFT = 0
+PRESS_RIGHT = 1
+PRESS_DOWN = 2
+RELEASE_LEFT = 3
+RELEASE_RIGHT = 4
+RELEASE_DOWN = 5
+STEP_LEFT = 6
+STEP_RIGHT = 7
+STEP_DOWN = 8
+STEP_ROTATE = 9
+STEP_DROP = 10
+RESET = 11
+RESTORE = 13  # Отмена хода или повтор партии, за кодом идут длина и состояние движка после возврата
+END = 14  # Конец записи, его время — длительность партии
+KEYFRAME = 15  # Ключевой кадр, за кодом идут длина и состояние движка
+
+INPUTS = {
+    PRESS_LEFT: lambda engine: engine.press(LEFT),
+    PRESS_RIGHT: lambda engine: engine.press(RIGHT),
+    PRESS_DOWN: lambda engine: engine.press(DOWN),
+    RELEASE_LEFT: lambda engine: engine.release(LEFT),
+    RELEASE_RIGHT: lambda engine: engine.release(RIGHT),
+    RELEASE_DOWN: lambda engine: engine.release(DOWN),
+    STEP_LEFT: lambda engine: engine.step(LEFT),
+    STEP_RIGHT: lambda engine: engine.step(RIGHT),
+    STEP_DOWN: lambda engine: engine.step(DOWN),
+    STEP_ROTATE: lambda engine: engine.step(ROTATE),
+    STEP_DROP: lambda engine: engine.step(DROP),
+    RESET: lambda engine: engine.reset(),
+}
+
+# Код события для действия Engine.step
+STEP_INPUTS = {
+    LEFT: STEP_LEFT,
+    RIGHT: STEP_RIGHT,
+    DOWN: STEP_DOWN,
+    ROTATE: STEP_ROTATE,
+    DROP: STEP_DROP,
+}
+
+def apply_input(engine, code):
+    """Применение события ввода к движку"""
+    INPUTS[code](engine)
+
+def write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append(value & 0x7f | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+def read_varint(data, pos):
+    """Число из data начиная с pos, возвращает (число, новая позиция)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def encode_row(buffer, mask, colors):
+    """Строка поля: маска занятых клеток и индексы их цветов слева направо"""
+    write_varint(buffer, mask)
+    buffer.extend(CELL_COLORS.index(color) for color in colors if color)
+
+def decode_row(data, pos, colors):
+    """Строка поля в список colors, возвращает (маска, новая позиция)"""
+    mask, pos = read_varint(data, pos)
+    for j in range(len(colors)):
+        if mask >> j & 1:
+            colors[j] = CELL_COLORS[data[pos]]
+            pos += 1
+        else:
+            colors[j] = 0
+    return mask, pos
+
+def encode_piece(buffer, piece):
+    for value in (piece['id'], piece['rotation'], COLORS.index(piece['color']), piece['x'], piece['y']):
+        write_varint(buffer, value)
+
+def decode_piece(data, pos):
+    values = []
+    for _ in range(5):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    piece_id, rotation, color, x, y = values
+    return {'id': piece_id, 'rotation': rotation, 'color': COLORS[color], 'x': x, 'y': y}, pos
+
+def encode_statistics(buffer, statistics):
+    """Итоги игрока: партии, линии, очки, макс. уровень, рекорд и маска достижений"""
+    for value in (statistics.games_played, statistics.total_lines, statistics.total_score,
+                  statistics.max_level, statistics.best_score):
+        write_varint(buffer, value)
+    write_varint(buffer, sum(1 << i for i, achievement in enumerate(statistics.achievements.values())
+                             if achievement['achieved']))
+
+def decode_statistics(data, pos, statistics):
+    """Итоги игрока из data в statistics, возвращает новую позицию"""
+    values = []
+    for _ in range(6):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    (statistics.games_played, statistics.total_lines, statistics.total_score,
+     statistics.max_level, statistics.best_score, mask) = values
+    for i, achievement in enumerate(statistics.achievements.values()):
+        achievement['achieved'] = bool(mask >> i & 1)
+    return pos
+
+def encode_state(engine):
+    """Полное состояние движка для ключевого кадра вместе со статистикой игрока"""
+    buffer = bytearray()
+    for value in (engine.score, engine.level, engine.lines_cleared_total, engine.fall_time,
+                  engine.fall_speed, int(engine.game_over), engine.pieces_drawn):
+        write_varint(buffer, value)
+    for action in engine.held:
+        write_varint(buffer, int(engine.held[action]))
+        write_varint(buffer, engine.move_time[action])
+    encode_piece(buffer, engine.current_piece)
+    encode_piece(buffer, engine.next_piece)
+
+    board = engine.board
+    write_varint(buffer, board.top)  # Выше верха стопки поле пустое и не пишется
+    for _, mask, colors in board.stored_rows():
+        encode_row(buffer, mask, colors)
+    encode_statistics(buffer, engine.statistics)
+    return bytes(buffer)
+
+def restore_state(engine, data, version=VERSION):
+    """Восстановление движка из ключевого кадра, генератор фигур перематывается по сиду"""
+    pos = 0
+    values = []
+    for _ in range(7):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    (engine.score, engine.level, engine.lines_cleared_total, engine.fall_time,
+     engine.fall_speed, game_over, pieces_drawn) = values
+    engine.game_over = bool(game_over)
+    for action in engine.held:
+        held, pos = read_varint(data, pos)
+        engine.held[action] = bool(held)
+        engine.move_time[action], pos = read_varint(data, pos)
+        if version < 4:
+            # Раньше хранилось время с последнего повтора, теперь — время до следующего
+            engine.move_time[action] = LEGACY_REPEAT_MS - engine.move_time[action]
+    engine.current_piece, pos = decode_piece(data, pos)
+    engine.next_piece, pos = decode_piece(data, pos)
+
+    board = Board(engine.board.width, engine.board.height)
+    colors = [0] * board.width
+    top = 0
+    if version >= 6:
+        top, pos = read_varint(data, pos)
+    for i in range(top, board.height):
+        mask, pos = decode_row(data, pos, colors)
+        board.set_row(i, mask, colors)
+    board.rebuild_index()
+    engine.board = board
+    if version >= 5:
+        decode_statistics(data, pos, engine.statistics)
+
+    engine.rewind_rng(pieces_drawn)
+
+class ReplayRecorder:
+    """Запись событий ввода одной сессии в память, сохранение в файл в конце"""
+    def __init__(self, seed, step_ms, keyframe_interval=KEYFRAME_INTERVAL_MS,
+                 width=GRID_WIDTH, height=GRID_HEIGHT, das=DAS_MS, arr=ARR_MS, statistics=None):
+        self.keyframe_interval = keyframe_interval
+        self.data = bytearray(MAGIC)
+        self.data.append(VERSION)
+        write_varint(self.data, seed)
+        write_varint(self.data, step_ms)
+        write_varint(self.data, width)
+        write_varint(self.data, height)
+        write_varint(self.data, das)
+        write_varint(self.data, arr)
+        # Статистика на начало записи: воспроизведение с начала и с ключевого кадра рисуют одно и то же
+        encode_statistics(self.data, statistics if statistics is not None else Statistics())
+        self.last_time = 0
+        self.last_keyframe = 0
+
+    def record(self, time_ms, code):
+        write_varint(self.data, (time_ms - self.last_time) << 4 | code)
+        self.last_time = time_ms
+
+    def keyframe(self, engine):
+        """Ключевой кадр, если с прошлого прошло достаточно игрового времени"""
+        if engine.elapsed - self.last_keyframe < self.keyframe_interval:
+            return
+        self.last_keyframe = engine.elapsed
+        self.record_state(KEYFRAME, engine)
+
+    def restore(self, engine):
+        """Возврат к снимку в игре: история снимков в запись не попадает, пишется результат"""
+        self.record_state(RESTORE, engine)
+
+    def record_state(self, code, engine):
+        state = encode_state(engine)
+        self.record(engine.elapsed, code)
+        write_varint(self.data, len(state))
+        self.data.extend(state)
+
+    def finish(self, time_ms):
+        self.record(time_ms, END)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.data)
+
+class Replay:
+    """Загруженная запись: воспроизведение без дисплея быстрее реального времени и перемотка"""
+    def __init__(self, data):
+        if data[:4] != MAGIC or not 1 <= data[4] <= VERSION:
+            raise ValueError('Неизвестный формат записи')
+        self.version = data[4]
+        pos = 5
+        self.seed, pos = read_varint(data, pos)
+        self.step_ms, pos = read_varint(data, pos)
+        self.width, self.height = GRID_WIDTH, GRID_HEIGHT  # Версия 1 писалась только для обычного поля
+        if self.version >= 2:
+            self.width, pos = read_varint(data, pos)
+            self.height, pos = read_varint(data, pos)
+        self.das, self.arr = LEGACY_REPEAT_MS, LEGACY_REPEAT_MS
+        if self.version >= 4:
+            self.das, pos = read_varint(data, pos)
+            self.arr, pos = read_varint(data, pos)
+        self.statistics = b''  # Статистика на начало записи; до версии 5 не записывалась
+        if self.version >= 5:
+            start = pos
+            pos = decode_statistics(data, pos, Statistics())
+            self.statistics = bytes(data[start:pos])
+        self.events = []  # (время, код)
+        self.restores = {}  # Номер события RESTORE -> состояние движка
+        self.keyframes = []  # (время, номер следующего события, состояние)
+        self.duration = 0
+
+        time_ms = 0
+        while pos < len(data):
+            value, pos = read_varint(data, pos)
+            time_ms += value >> 4
+            code = value & 0xf
+            if code == KEYFRAME:
+                length, pos = read_varint(data, pos)
+                self.keyframes.append((time_ms, len(self.events), bytes(data[pos:pos + length])))
+                pos += length
+            elif code == RESTORE:
+                length, pos = read_varint(data, pos)
+                self.restores[len(self.events)] = bytes(data[pos:pos + length])
+                self.events.append((time_ms, code))
+                pos += length
+            elif code == END:
+                self.duration = time_ms
+            else:
+                self.events.append((time_ms, code))
+        self.duration = max(self.duration, time_ms)
+        self.keyframe_times = [keyframe[0] for keyframe in self.keyframes]
+        self.event_times = [event[0] for event in self.events]
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    def new_engine(self):
+        """Движок с размером поля, правилами повтора движений и статистикой на начало этой записи"""
+        statistics = Statistics()
+        if self.statistics:
+            decode_statistics(self.statistics, 0, statistics)
+        engine = Engine(statistics, seed=self.seed, width=self.width, height=self.height,
+                        das=self.das, arr=self.arr)
+        if self.version < 4:
+            engine.soft_drop = LEGACY_REPEAT_MS
+            engine.shift_on_press = False
+        return engine
+
+    def play(self, until=None, engine=None, start=0):
+        """Пересимуляция партии до момента until (по умолчанию до конца), возвращает движок"""
+        if engine is None:
+            engine = self.new_engine()
+        until = self.duration if until is None else until
+        for index in range(start, len(self.events)):
+            time_ms, code = self.events[index]
+            if time_ms > until:
+                break
+            engine.advance(time_ms - engine.elapsed, self.step_ms)
+            if code == RESTORE:
+                restore_state(engine, self.restores[index], self.version)
+            else:
+                apply_input(engine, code)
+        engine.advance(until - engine.elapsed, self.step_ms)
+        return engine
+
+    def seek(self, time_ms):
+        """Состояние на момент time_ms: от ближайшего ключевого кадра, а не с начала"""
+        index = bisect.bisect_right(self.keyframe_times, time_ms) - 1
+        if index < 0:
+            return self.play(time_ms)
+        keyframe_time, event_index, state = self.keyframes[index]
+        engine = self.new_engine()
+        restore_state(engine, state, self.version)
+        engine.elapsed = keyframe_time
+        return self.play(time_ms, engine, event_index)
+
+    def states(self, times):
+        """Движок в моменты times (по возрастанию): перемотка к первому, дальше только вперед.
+
+        Отдается один и тот же изменяющийся движок, копировать его между шагами не нужно."""
+        engine = None
+        index = 0
+        for time_ms in times:
+            if engine is None:
+                engine = self.seek(time_ms)
+            else:
+                engine = self.play(time_ms, engine, index)
+            index = bisect.bisect_right(self.event_times, time_ms, index)
+            yield engine
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизведение записи партии без дисплея')
+    parser.add_argument('path', help='Файл записи')
+    parser.add_argument('--seek', type=int, default=None, help='Перемотать к моменту, мс')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    replay = Replay.load(args.path)
+    engine = replay.play() if args.seek is None else replay.seek(args.seek)
+    elapsed = time.perf_counter() - started
+
+    print(f'Сид: {replay.seed}, событий: {len(replay.events)}, ключевых кадров: {len(replay.keyframes)}')
+    print(f'Счет: {engine.score}, уровень: {engine.level}, линий: {engine.lines_cleared_total}')
+    print(f'Игровое время {engine.elapsed / 1000:.1f} с воспроизведено за {elapsed:.3f} с')
+
+if __name__ == '__main__':
+    main()
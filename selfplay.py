@@ -0,0 +1,132 @@
+import argparse
+import multiprocessing
+import os
+import random
+import time
+
+from engine import Engine, Statistics, LEFT, RIGHT, ROTATE, DROP
+from ai import AutoPlayer
+from storage import StatsStore, achievement_mask
+
+# Турнир ботов: партии с заданными сидами играются без дисплея в пуле процессов
+# (по одному на ядро), результаты по мере готовности сливаются в общую Statistics.
+
+def random_strategy(time_budget):
+    """Случайные повороты и сдвиги, затем мгновенный сброс"""
+    def act(engine):
+        actions = [random.choice((LEFT, RIGHT, ROTATE)) for _ in range(random.randrange(8))]
+        return actions + [DROP]
+    return act
+
+def autoplayer_strategy(lookahead):
+    """Бот из ai.py: с просмотром следующей фигуры или только по текущей"""
+    def make(time_budget):
+        return AutoPlayer(time_budget=time_budget, lookahead=lookahead).act
+    return make
+
+# Стратегия: фабрика, которая по лимиту времени на ход возвращает act(engine) -> действия
+STRATEGIES = {
+    'random': random_strategy,
+    'greedy': autoplayer_strategy(False),
+    'ai': autoplayer_strategy(True),
+}
+
+def game_statistics(engine):
+    """Итоги партии по финальным счету, линиям и уровню.
+
+    Statistics.update в игре берет счет до начисления очков за очистку и прибавляет его
+    к total_score при каждой очистке, поэтому для сводки турнира статистика движка не годится."""
+    statistics = Statistics()
+    statistics.update(engine.lines_cleared_total, engine.score, engine.level)
+    statistics.games_played = 1
+    return statistics
+
+def play_game(task):
+    """Одна партия без дисплея по тем же правилам очков и уровней, что и в игре"""
+    seed, strategy, max_pieces, time_budget = task
+    random.seed(seed)
+    started = time.perf_counter()
+    engine = Engine(Statistics(), seed=seed)
+    act = STRATEGIES[strategy](time_budget)
+    pieces = 0
+
+    while not engine.game_over and pieces < max_pieces:
+        for action in act(engine):
+            engine.step(action)
+        # Гравитация до фиксации фигуры: каждый tick длиной fall_speed опускает ее на строку
+        piece = engine.current_piece
+        while engine.current_piece is piece and not engine.game_over:
+            engine.tick(engine.fall_speed)
+        pieces += 1
+
+    # Партия, остановленная по лимиту фигур, в статистике тоже считается сыгранной
+    return {
+        'seed': seed,
+        'score': engine.score,
+        'lines': engine.lines_cleared_total,
+        'level': engine.level,
+        'pieces': pieces,
+        'duration': time.perf_counter() - started,
+        'statistics': game_statistics(engine),
+    }
+
+def run_tournament(games, strategy='ai', workers=None, chunksize=None, seed=0,
+                   max_pieces=1000, time_budget=None, on_result=None):
+    """Играет games партий в пуле процессов, возвращает (Statistics, партий в секунду)"""
+    workers = workers or os.cpu_count() or 1
+    if chunksize is None:
+        # Несколько порций на процесс: меньше обменов, но нагрузка все еще выравнивается
+        chunksize = max(1, games // (workers * 8))
+    tasks = [(seed + i, strategy, max_pieces, time_budget) for i in range(games)]
+
+    statistics = Statistics()
+    started = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap_unordered(play_game, tasks, chunksize):
+            statistics.merge(result['statistics'])
+            if on_result:
+                on_result(result)
+    elapsed = time.perf_counter() - started
+    return statistics, games / elapsed if elapsed else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description='Турнир ботов: много партий в пуле процессов')
+    parser.add_argument('--games', type=int, default=100, help='Количество партий')
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='ai', help='Стратегия бота')
+    parser.add_argument('--workers', type=int, default=None, help='Процессов (по умолчанию по числу ядер)')
+    parser.add_argument('--chunksize', type=int, default=None, help='Партий в одной порции для процесса')
+    parser.add_argument('--seed', type=int, default=0, help='Сид первой партии, дальше по порядку')
+    parser.add_argument('--max-pieces', type=int, default=1000, help='Лимит фигур в одной партии')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='Лимит времени бота на ход, секунды (по умолчанию без лимита)')
+    parser.add_argument('--verbose', action='store_true', help='Печатать результат каждой партии')
+    parser.add_argument('--stats', metavar='DIR', default=None,
+                        help='Сохранять партии в хранилище (см. storage.py) под именем бота')
+    args = parser.parse_args()
+    store = StatsStore(args.stats) if args.stats else None
+
+    def report(result):
+        if store:
+            store.record(f'bot-{args.strategy}', result['score'], result['lines'], result['level'],
+                         result['seed'], achievement_mask(result['statistics']))
+        if args.verbose:
+            print(f"сид {result['seed']}: счет {result['score']}, линий {result['lines']}, "
+                  f"уровень {result['level']}, фигур {result['pieces']}, {result['duration']:.2f} с")
+
+    statistics, games_per_second = run_tournament(
+        args.games, args.strategy, args.workers, args.chunksize, args.seed,
+        args.max_pieces, args.time_budget, report)
+    if store:
+        store.close()
+
+    print(f'Партий: {statistics.games_played}')
+    print(f'Линий: {statistics.total_lines}')
+    print(f'Очков: {statistics.total_score}')
+    print(f'Рекорд: {statistics.best_score}')
+    print(f'Макс. уровень: {statistics.max_level}')
+    achieved = [a['name'] for a in statistics.achievements.values() if a['achieved']]
+    print(f"Достижения: {', '.join(achieved) or 'нет'}")
+    print(f'Партий в секунду: {games_per_second:.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,425 @@
+import argparse
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from engine import Statistics
+
+# Постоянная статистика: каждая законченная партия — запись фиксированного размера
+# в журнале только на дозапись. Рядом лежит файл индексов (сводные счетчики, таблица
+# лучших результатов, лучший результат каждого игрока, итоги по дням); он открывается
+# через mmap и обновляется на месте, поэтому старт и запросы не зависят от длины журнала.
+
+LOG_NAME = 'games.log'
+INDEX_NAME = 'games.idx'
+LOG_MAGIC = b'TGLG'
+INDEX_MAGIC = b'TGIX'
+VERSION = 1
+
+# Заголовок журнала: итоги партий, удаленных сжатием (партии, линии, очки, рекорд, уровень, достижения)
+LOG_HEADER = struct.Struct('<4sH2xQQQQII')
+# Запись партии: время, игрок, сид, счет, линии, уровень, маска достижений
+RECORD = struct.Struct('<d16sIIIHH')
+
+# Заголовок индекса, за ним таблица лучших, итоги по дням и хеш-таблица игроков
+INDEX_HEADER = struct.Struct('<4sH2x5Q6I')
+HEADER_FIELDS = ('magic', 'version', 'records', 'games', 'lines', 'score', 'best', 'max_level',
+                 'achievements', 'top_count', 'top_capacity', 'player_count', 'player_capacity')
+TOP_ENTRY = struct.Struct('<IQ')  # Счет, номер записи; по убыванию счета
+DAY_SLOT = struct.Struct('<IIQQ')  # День, партии, линии, очки
+PLAYER_SLOT = struct.Struct('<16sIQI')  # Игрок, рекорд, номер записи рекорда, партии
+DAYS = 32  # Кольцо дневных итогов, больше этого окна rolling_totals не охватывает
+DAY_SECONDS = 86400
+MAX_LOAD = 0.7  # Заполненность таблицы игроков, после которой она увеличивается вдвое
+READ_CHUNK = 4096  # Записей за одно чтение при полном пересчете
+
+def encode_player(name):
+    """Имя игрока в 16 байт UTF-8 (обрезается по границе символа)"""
+    data = name.encode('utf-8')[:16].decode('utf-8', 'ignore').encode('utf-8')
+    if not data:
+        raise ValueError('Пустое имя игрока')
+    return data.ljust(16, b'\0')
+
+def decode_player(data):
+    return data.rstrip(b'\0').decode('utf-8')
+
+def achievement_mask(statistics):
+    """Достижения Statistics битовой маской в порядке словаря achievements"""
+    return sum(1 << i for i, achievement in enumerate(statistics.achievements.values())
+               if achievement['achieved'])
+
+def index_size(top_capacity, player_capacity):
+    return (INDEX_HEADER.size + top_capacity * TOP_ENTRY.size + DAYS * DAY_SLOT.size
+            + player_capacity * PLAYER_SLOT.size)
+
+class StatsStore:
+    """Журнал партий и индексы к нему в каталоге directory"""
+    def __init__(self, directory, top_capacity=100, player_capacity=256):
+        # Пробирование таблицы игроков идет по маске capacity - 1: размер только степень двойки
+        player_capacity = 1 << max(0, player_capacity - 1).bit_length()
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, LOG_NAME)
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self.open_log()
+
+        self.index_file = None
+        self.index = None
+        if not self.load_index():
+            self.rebuild(top_capacity, player_capacity)
+        elif self.header['records'] < self.count:
+            # Процесс упал между записью в журнал и обновлением индекса. Таблицы в mmap могли
+            # успеть учесть запись до заголовка, и досчет хвоста учел бы ее второй раз
+            self.rebuild(self.header['top_capacity'], self.header['player_capacity'])
+
+    def open_log(self):
+        self.log = open(self.log_path, 'a+b')  # Запись всегда в конец, чтение с любого места
+        size = self.log.seek(0, os.SEEK_END)
+        if size < LOG_HEADER.size:
+            self.log.truncate(0)
+            self.log.write(LOG_HEADER.pack(LOG_MAGIC, VERSION, 0, 0, 0, 0, 0, 0))
+            self.log.flush()
+            size = LOG_HEADER.size
+        self.log.seek(0)
+        magic, version, *self.base = LOG_HEADER.unpack(self.log.read(LOG_HEADER.size))
+        if magic != LOG_MAGIC or version != VERSION:
+            raise ValueError(f'Неизвестный формат журнала: {self.log_path}')
+        self.count, torn = divmod(size - LOG_HEADER.size, RECORD.size)
+        if torn:
+            # Недописанная последняя запись после сбоя
+            self.log.truncate(size - torn)
+
+    def load_index(self):
+        """Открытие индекса через mmap; False, если его нет или он не сходится с журналом"""
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) < INDEX_HEADER.size:
+            return False
+        self.map_index()
+        header = self.header
+        if (header['magic'] != INDEX_MAGIC or header['version'] != VERSION
+                or len(self.index) != index_size(header['top_capacity'], header['player_capacity'])
+                or header['records'] > self.count):
+            self.close_index()
+            return False
+        return True
+
+    def map_index(self):
+        self.index_file = open(self.index_path, 'r+b')
+        self.index = mmap.mmap(self.index_file.fileno(), 0)
+        self.header = dict(zip(HEADER_FIELDS, INDEX_HEADER.unpack_from(self.index, 0)))
+        self.top_offset = INDEX_HEADER.size
+        self.days_offset = self.top_offset + self.header['top_capacity'] * TOP_ENTRY.size
+        self.players_offset = self.days_offset + DAYS * DAY_SLOT.size
+
+    def close_index(self):
+        if self.index is not None:
+            self.index.close()
+            self.index_file.close()
+            self.index = None
+
+    def create_index(self, top_capacity, player_capacity, header=None, top=b'', days=b''):
+        """Новый файл индекса; содержимое собирается во временном файле и подменяет старый"""
+        self.close_index()
+        size = index_size(top_capacity, player_capacity)
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.truncate(size)
+            values = dict(header or {}, magic=INDEX_MAGIC, version=VERSION,
+                          top_capacity=top_capacity, player_capacity=player_capacity, player_count=0)
+            for name in HEADER_FIELDS:
+                values.setdefault(name, 0)
+            f.write(INDEX_HEADER.pack(*(values[name] for name in HEADER_FIELDS)))
+            f.write(top)
+            f.seek(INDEX_HEADER.size + top_capacity * TOP_ENTRY.size)
+            f.write(days)
+        os.replace(temp_path, self.index_path)
+        self.map_index()
+
+    def write_header(self):
+        INDEX_HEADER.pack_into(self.index, 0, *self.header.values())
+
+    def rebuild(self, top_capacity=None, player_capacity=None):
+        """Полный пересчет индекса по журналу: итоги сжатых партий берутся из заголовка журнала.
+
+        Число партий игроков, удаленных сжатием, при этом не восстанавливается."""
+        games, lines, score, best, max_level, achievements = self.base
+        self.create_index(top_capacity or 100, player_capacity or 256,
+                          {'games': games, 'lines': lines, 'score': score, 'best': best,
+                           'max_level': max_level, 'achievements': achievements})
+        number = 0
+        while number < self.count:
+            chunk = self.read_bytes(number, min(READ_CHUNK, self.count - number))
+            for record in RECORD.iter_unpack(chunk):
+                self.index_record(number, record)
+                number += 1
+
+    def index_record(self, number, record):
+        """Учет записи number во всех индексах"""
+        when, player, seed, score, lines, level, achievements = record
+        header = self.header
+        header['games'] += 1
+        header['lines'] += lines
+        header['score'] += score
+        header['best'] = max(header['best'], score)
+        header['max_level'] = max(header['max_level'], level)
+        header['achievements'] |= achievements
+        self.insert_top(score, number)
+        self.update_player(player, score, number)
+        self.update_day(int(when // DAY_SECONDS), lines, score)
+        # Заголовок пишется последним: до этого запись считается непроиндексированной.
+        # self.header, а не header: при росте таблицы игроков индекс открывается заново
+        self.header['records'] = number + 1
+        self.write_header()
+
+    def top_entry(self, i):
+        return TOP_ENTRY.unpack_from(self.index, self.top_offset + i * TOP_ENTRY.size)
+
+    def insert_top(self, score, number):
+        """Вставка в отсортированную таблицу лучших; при равенстве выше более ранняя партия"""
+        count = self.header['top_count']
+        capacity = self.header['top_capacity']
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.top_entry(mid)[0] >= score:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo >= capacity:
+            return
+        size = TOP_ENTRY.size
+        start = self.top_offset + lo * size
+        end = self.top_offset + min(count, capacity - 1) * size
+        self.index[start + size:end + size] = self.index[start:end]
+        TOP_ENTRY.pack_into(self.index, start, score, number)
+        self.header['top_count'] = min(count + 1, capacity)
+
+    def find_player(self, name):
+        """Слот игрока (или пустой слот, куда его вставить) линейным пробированием"""
+        capacity = self.header['player_capacity']
+        slot = zlib.crc32(name) & (capacity - 1)
+        while True:
+            offset = self.players_offset + slot * PLAYER_SLOT.size
+            stored = self.index[offset:offset + 16]
+            if stored == name:
+                return offset, True
+            if not any(stored):
+                return offset, False
+            slot = (slot + 1) & (capacity - 1)
+
+    def update_player(self, name, score, number):
+        offset, found = self.find_player(name)
+        if not found:
+            if (self.header['player_count'] + 1) > self.header['player_capacity'] * MAX_LOAD:
+                self.grow_players()
+                offset, found = self.find_player(name)
+            self.header['player_count'] += 1
+            PLAYER_SLOT.pack_into(self.index, offset, name, score, number, 1)
+            return
+        _, best, best_record, games = PLAYER_SLOT.unpack_from(self.index, offset)
+        if score > best:
+            best, best_record = score, number
+        PLAYER_SLOT.pack_into(self.index, offset, name, best, best_record, games + 1)
+
+    def players(self):
+        """Все занятые слоты таблицы игроков: (имя, рекорд, номер записи, партии)"""
+        for slot in range(self.header['player_capacity']):
+            entry = PLAYER_SLOT.unpack_from(self.index, self.players_offset + slot * PLAYER_SLOT.size)
+            if any(entry[0]):
+                yield entry
+
+    def grow_players(self):
+        """Таблица игроков вдвое больше; лучшие результаты и дневные итоги переносятся как есть"""
+        players = list(self.players())
+        header = dict(self.header)
+        top = self.index[self.top_offset:self.days_offset]
+        days = self.index[self.days_offset:self.players_offset]
+        self.create_index(header['top_capacity'], header['player_capacity'] * 2, header, top, days)
+        for entry in players:
+            offset, _ = self.find_player(entry[0])
+            PLAYER_SLOT.pack_into(self.index, offset, *entry)
+        self.header['player_count'] = len(players)
+        self.write_header()
+
+    def update_day(self, day, lines, score):
+        offset = self.days_offset + day % DAYS * DAY_SLOT.size
+        slot_day, games, slot_lines, slot_score = DAY_SLOT.unpack_from(self.index, offset)
+        if slot_day > day:
+            return  # Слот уже занят более поздним днем, этот день вне окна
+        if slot_day < day:
+            games = slot_lines = slot_score = 0
+        DAY_SLOT.pack_into(self.index, offset, day, games + 1, slot_lines + lines, slot_score + score)
+
+    def read_bytes(self, number, count):
+        self.log.seek(LOG_HEADER.size + number * RECORD.size)
+        return self.log.read(count * RECORD.size)
+
+    def read_raw(self, number):
+        return RECORD.unpack(self.read_bytes(number, 1))
+
+    def read_record(self, number):
+        when, player, seed, score, lines, level, achievements = self.read_raw(number)
+        return {'number': number, 'time': when, 'player': decode_player(player), 'seed': seed,
+                'score': score, 'lines': lines, 'level': level, 'achievements': achievements}
+
+    def record(self, player, score, lines, level, seed=0, achievements=0, when=None):
+        """Дозапись законченной партии, возвращает номер записи"""
+        record = (time.time() if when is None else when, encode_player(player),
+                  seed & 0xffffffff, score, lines, level, achievements)
+        self.log.write(RECORD.pack(*record))
+        self.log.flush()
+        number = self.count
+        self.count += 1
+        self.index_record(number, record)
+        return number
+
+    def record_game(self, player, engine):
+        """Дозапись партии движка engine"""
+        return self.record(player, engine.score, engine.lines_cleared_total, engine.level,
+                           engine.seed, achievement_mask(engine.statistics))
+
+    def top(self, n=10):
+        """n лучших партий по счету (не больше top_capacity)"""
+        return [self.read_record(self.top_entry(i)[1])
+                for i in range(min(n, self.header['top_count']))]
+
+    def player_best(self, player):
+        """Рекорд и число партий игрока или None, если он еще не играл"""
+        name = encode_player(player)
+        offset, found = self.find_player(name)
+        if not found:
+            return None
+        _, best, best_record, games = PLAYER_SLOT.unpack_from(self.index, offset)
+        return {'player': player, 'best': best, 'games': games, 'record': self.read_record(best_record)}
+
+    def totals(self):
+        header = self.header
+        return {'games': header['games'], 'lines': header['lines'], 'score': header['score'],
+                'best_score': header['best'], 'max_level': header['max_level']}
+
+    def rolling_totals(self, days=7, now=None):
+        """Партии, линии и очки за последние days дней, включая текущий"""
+        if not 0 < days <= DAYS:
+            raise ValueError(f'Окно должно быть от 1 до {DAYS} дней')
+        today = int((time.time() if now is None else now) // DAY_SECONDS)
+        result = {'games': 0, 'lines': 0, 'score': 0}
+        for slot in range(DAYS):
+            day, games, lines, score = DAY_SLOT.unpack_from(self.index, self.days_offset + slot * DAY_SLOT.size)
+            if games and today - days < day <= today:
+                result['games'] += games
+                result['lines'] += lines
+                result['score'] += score
+        return result
+
+    def statistics(self):
+        """Statistics с итогами всех сохраненных партий"""
+        statistics = Statistics()
+        header = self.header
+        statistics.games_played = header['games']
+        statistics.total_lines = header['lines']
+        statistics.total_score = header['score']
+        statistics.best_score = header['best']
+        statistics.max_level = max(1, header['max_level'])
+        for i, achievement in enumerate(statistics.achievements.values()):
+            achievement['achieved'] = bool(header['achievements'] >> i & 1)
+        return statistics
+
+    def compact(self, retain_days=DAYS, now=None):
+        """Удаление из журнала партий старше retain_days дней, кроме лучших и рекордов игроков.
+
+        Итоги удаленных партий переходят в заголовок журнала, индексы только перенумеровываются.
+        Возвращает число удаленных записей."""
+        cutoff = int((time.time() if now is None else now) // DAY_SECONDS) - retain_days
+        keep = {self.top_entry(i)[1] for i in range(self.header['top_count'])}
+        keep.update(entry[2] for entry in self.players())
+
+        games, lines, score, best, max_level, achievements = self.base
+        renumbered = {}
+        temp_path = self.log_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(LOG_HEADER.pack(LOG_MAGIC, VERSION, 0, 0, 0, 0, 0, 0))  # Итоги допишутся в конце
+            kept = 0
+            number = 0
+            while number < self.count:
+                chunk = self.read_bytes(number, min(READ_CHUNK, self.count - number))
+                for record in RECORD.iter_unpack(chunk):
+                    if number in keep or int(record[0] // DAY_SECONDS) > cutoff:
+                        if number in keep:
+                            renumbered[number] = kept
+                        f.write(RECORD.pack(*record))
+                        kept += 1
+                    else:
+                        games += 1
+                        lines += record[4]
+                        score += record[3]
+                        best = max(best, record[3])
+                        max_level = max(max_level, record[5])
+                        achievements |= record[6]
+                    number += 1
+            f.seek(0)
+            f.write(LOG_HEADER.pack(LOG_MAGIC, VERSION, games, lines, score, best, max_level, achievements))
+
+        dropped = self.count - kept
+        self.log.close()
+        os.replace(temp_path, self.log_path)
+        self.open_log()
+
+        for i in range(self.header['top_count']):
+            top_score, number = self.top_entry(i)
+            TOP_ENTRY.pack_into(self.index, self.top_offset + i * TOP_ENTRY.size,
+                                top_score, renumbered[number])
+        for slot in range(self.header['player_capacity']):
+            offset = self.players_offset + slot * PLAYER_SLOT.size
+            name, player_best, best_record, player_games = PLAYER_SLOT.unpack_from(self.index, offset)
+            if any(name):
+                PLAYER_SLOT.pack_into(self.index, offset, name, player_best, renumbered[best_record],
+                                      player_games)
+        self.header['records'] = self.count
+        self.write_header()
+        self.index.flush()
+        return dropped
+
+    def close(self):
+        if self.index is not None:
+            self.index.flush()
+        self.close_index()
+        self.log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Таблица рекордов и итоги сохраненных партий')
+    parser.add_argument('directory', help='Каталог хранилища')
+    parser.add_argument('--top', type=int, default=10, help='Сколько лучших партий показать')
+    parser.add_argument('--player', default=None, help='Рекорд игрока')
+    parser.add_argument('--days', type=int, default=7, help='Окно итогов по дням')
+    parser.add_argument('--compact', type=int, metavar='DAYS', default=None,
+                        help='Сжать журнал, оставив партии за последние DAYS дней')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with StatsStore(args.directory) as store:
+        opened = time.perf_counter() - started
+        if args.compact is not None:
+            print(f'Удалено записей: {store.compact(args.compact)}')
+        totals = store.totals()
+        print(f"Партий: {totals['games']}, линий: {totals['lines']}, очков: {totals['score']}, "
+              f"рекорд: {totals['best_score']}, макс. уровень: {totals['max_level']}")
+        rolling = store.rolling_totals(args.days)
+        print(f"За {args.days} дн.: партий {rolling['games']}, линий {rolling['lines']}, "
+              f"очков {rolling['score']}")
+        if args.player:
+            best = store.player_best(args.player)
+            print(f"{args.player}: рекорд {best['best']}, партий {best['games']}" if best
+                  else f'{args.player}: партий нет')
+        for place, record in enumerate(store.top(args.top), 1):
+            print(f"{place:3}. {record['player']:16} {record['score']:8} "
+                  f"(линий {record['lines']}, уровень {record['level']})")
+        print(f'Записей в журнале: {store.count}, открытие {opened * 1000:.1f} мс')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from ai import AutoPlayer, default_heuristic
+from engine import Engine, LEFT, RIGHT, ROTATE, DROP
+
+WIDTH = 6
+HEIGHT = 10
+SEEDS = range(30)
+
+def random_game(seed):
+    """Маленькое поле со случайной неровной стопкой до половины высоты, без полных строк"""
+    rnd = random.Random(seed)
+    game = Engine(seed=seed, width=WIDTH, height=HEIGHT)
+    board = game.board
+    for i in range(HEIGHT - rnd.randrange(HEIGHT // 2), HEIGHT):
+        mask = rnd.getrandbits(WIDTH)
+        if mask == board.full_row:
+            mask &= ~(1 << rnd.randrange(WIDTH))
+        board.set_row(i, mask, [1 if mask >> j & 1 else 0 for j in range(WIDTH)])
+    board.rebuild_index()
+    return game
+
+def placements(game):
+    """Снимки после фиксации текущей фигуры во всех положениях, куда ее довести поворотами и
+    сдвигами на строке появления, и число очищенных при этом линий; перебор идет через Engine"""
+    start = game.snapshot()
+    seen = set()
+    results = []
+    queue = [()]
+    for path in queue:
+        game.restore(start)
+        for action in path:
+            game.step(action)
+        key = game.current_piece['rotation'], game.current_piece['x']
+        if key in seen:
+            continue
+        seen.add(key)
+        game.step(DROP)
+        results.append((game.lock_piece(), game.snapshot()))
+        queue += [path + (action,) for action in (LEFT, RIGHT, ROTATE)]
+    game.restore(start)
+    return results
+
+def value(game, lines, lookahead):
+    """Оценка поля после хода; с lookahead — лучшая по всем положениям следующей фигуры"""
+    if not lookahead:
+        return default_heuristic(game.board.masks(), lines, WIDTH)
+    if game.game_over:
+        return float('-inf')  # Следующей фигуре некуда появиться
+    best = float('-inf')
+    for cleared, snapshot in placements(game):
+        game.restore(snapshot)
+        best = max(best, default_heuristic(game.board.masks(), lines + cleared, WIDTH))
+    return best
+
+def exhaustive_value(game, lookahead):
+    best = float('-inf')
+    for lines, snapshot in placements(game):
+        game.restore(snapshot)
+        best = max(best, value(game, lines, lookahead))
+    return best
+
+@pytest.mark.parametrize('lookahead', [False, True])
+def test_choice_matches_exhaustive_search(lookahead):
+    for seed in SEEDS:
+        game = random_game(seed)
+        start = game.snapshot()
+        player = AutoPlayer(time_budget=None, lookahead=lookahead)
+        actions = player.act(game)
+        assert actions and actions[-1] == DROP
+        for action in actions:
+            game.step(action)
+        lines = game.lock_piece()
+        chosen = value(game, lines, lookahead)
+        game.restore(start)
+        assert chosen == exhaustive_value(game, lookahead), seed
@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')  # batch.py без NumPy не работает
+
+import batch
+import engine
+from ai import AutoPlayer
+from batch import BatchEngine
+from engine import COLORS, Engine
+
+SEEDS = range(16)
+STEPS = 800
+ACTIONS = {batch.LEFT: engine.LEFT, batch.RIGHT: engine.RIGHT, batch.DOWN: engine.DOWN,
+           batch.ROTATE: engine.ROTATE, batch.DROP: engine.DROP}
+BATCH_ACTIONS = {action: code for code, action in ACTIONS.items()}
+CHOICES = [batch.NOOP, batch.LEFT, batch.RIGHT, batch.DOWN, batch.ROTATE, batch.DROP, batch.DROP]
+
+class SeededBatch(BatchEngine):
+    """BatchEngine, где поле i получает фигуры из журнала Engine(seed=seeds[i])"""
+    def __init__(self, seeds, width, height):
+        self.engines = [Engine(seed=seed, width=width, height=height) for seed in seeds]
+        self.drawn = [0] * len(self.engines)
+        self.where = None
+        super().__init__(len(self.engines), width=width, height=height)
+
+    def reset(self, where=None):
+        self.where = np.ones(self.count, dtype=bool) if where is None else where
+        super().reset(where)
+
+    def spawn(self, where):
+        self.where = where
+        super().spawn(where)
+
+    def draw_pieces(self, count):
+        pieces, colors = [], []
+        for i in np.nonzero(self.where)[0]:
+            source = self.engines[i]
+            source.extend_sequence(self.drawn[i] + 1)
+            piece_id, color = source.sequence[self.drawn[i]]
+            self.drawn[i] += 1
+            pieces.append(piece_id)
+            colors.append(COLORS.index(color))
+        return np.array(pieces, dtype=np.int64), np.array(colors, dtype=np.int64)
+
+def engine_step(game, action):
+    """Шаг BatchEngine на Engine: действие и одна строка гравитации"""
+    if game.game_over:
+        return 0
+    reward = game.step(ACTIONS[action]) if action != batch.NOOP else 0
+    return reward + game.tick(game.fall_speed)
+
+def engine_cells(game):
+    return [[COLORS.index(color) + 1 if color else 0 for color in game.board.row_colors(i)]
+            for i in range(game.height)]
+
+@pytest.mark.parametrize('width, height', [(12, 22), (6, 12)])
+def test_batch_matches_engine(width, height):
+    # Бот чистит линии, а случайные действия вперемешку с ним доводят партии до конца
+    games = SeededBatch(SEEDS, width, height)
+    rnd = random.Random(width)
+    players = [AutoPlayer(lookahead=False) for _ in games.engines]
+    plans = [[] for _ in games.engines]
+    for _ in range(STEPS):
+        actions = []
+        for game, player, plan in zip(games.engines, players, plans):
+            plan += [BATCH_ACTIONS[action] for action in player.act(game)]
+            if rnd.random() < 0.05:
+                actions.append(rnd.choice(CHOICES))
+            else:
+                actions.append(plan.pop(0) if plan else batch.NOOP)
+        rewards, game_over = games.step(actions)
+        for i, game in enumerate(games.engines):
+            assert engine_step(game, actions[i]) == rewards[i]
+            assert game.score == games.score[i]
+            assert game.lines_cleared_total == games.lines_cleared_total[i]
+            assert game.game_over == game_over[i]
+            assert engine_cells(game) == games.boards[i].tolist()
+            if not game.game_over:
+                piece = game.current_piece
+                assert (piece['id'], piece['x'], piece['y']) == (games.piece[i], games.x[i], games.y[i])
+    # Сравнение не пустое: были и очищенные линии, и законченные партии
+    assert games.lines_cleared_total.sum() > 0
+    assert games.game_over.any()
@@ -0,0 +1,97 @@
+import random
+
+from ai import AutoPlayer
+from battle import (FRAME, START, STATE, END, TICK_MS, SEND_BUFFER_SOFT, BattleServer, Player,
+                    RemoteBoard)
+from engine import GARBAGE_COLOR
+from replay import STEP_INPUTS, read_varint
+
+class Transport:
+    def __init__(self):
+        self.buffered = 0  # Больше SEND_BUFFER_SOFT — клиент не успевает читать
+
+    def is_closing(self):
+        return False
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+class Writer:
+    """Сокет клиента: все, что сервер отправил, копится в data"""
+    def __init__(self):
+        self.transport = Transport()
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+class Client:
+    """Сторона клиента: поля матча, собранные из сообщений STATE"""
+    def __init__(self, name):
+        self.player = Player(None, Writer())
+        self.player.name = name
+        self.boards = None
+        self.winner = None
+
+    def receive(self):
+        data = self.player.writer.data
+        pos = 0
+        while pos < len(data):
+            (length,) = FRAME.unpack_from(data, pos)
+            payload = data[pos + FRAME.size:pos + FRAME.size + length]
+            pos += FRAME.size + length
+            if payload[0] == START:
+                values = []
+                offset = 1
+                for _ in range(4):
+                    value, offset = read_varint(payload, offset)
+                    values.append(value)
+                _, _, width, height = values
+                self.boards = [RemoteBoard(width, height) for _ in range(2)]
+            elif payload[0] == STATE:
+                self.boards[payload[1]].apply(payload)
+            elif payload[0] == END:
+                self.winner = payload[1]
+        del data[:]
+
+def assert_same(remote, engine):
+    assert remote.board.masks() == engine.board.masks()
+    assert ([remote.board.row_colors(i) for i in range(engine.height)]
+            == [engine.board.row_colors(i) for i in range(engine.height)])
+    assert remote.board.heights == engine.board.heights
+    assert (remote.score, remote.level, remote.lines_cleared_total, remote.game_over) == (
+        engine.score, engine.level, engine.lines_cleared_total, engine.game_over)
+    assert remote.pending_garbage == sum(count for count, _ in engine.pending_garbage)
+    assert (remote.current_piece, remote.next_piece) == (engine.current_piece, engine.next_piece)
+
+def test_deltas_reproduce_boards_after_garbage():
+    rnd = random.Random(3)
+    server = BattleServer(seed=3)
+    clients = [Client('alice'), Client('bob')]
+    for client in clients:
+        server.matchmake(client.player)
+    (match,) = server.matches
+    players = [AutoPlayer(lookahead=False) for _ in match.engines]
+    plans = [[] for _ in match.engines]
+    received = [False, False]
+    while not match.over:
+        for slot, engine in enumerate(match.engines):
+            plans[slot] += players[slot].act(engine)
+            for _ in range(min(len(plans[slot]), rnd.randrange(1, 4))):
+                match.input(slot, STEP_INPUTS[plans[slot].pop(0)])
+            if rnd.random() < 0.03:
+                engine.outgoing_garbage += rnd.randrange(1, 4)  # Как после очистки нескольких линий
+        for client in clients:
+            # Иногда клиент не успевает читать: дельты откладываются и потом догоняют
+            client.player.writer.transport.buffered = SEND_BUFFER_SOFT + 1 if rnd.random() < 0.1 else 0
+        match.tick(TICK_MS)
+        for slot, engine in enumerate(match.engines):
+            received[slot] |= any(GARBAGE_COLOR in colors for _, _, colors in engine.board.stored_rows())
+        for client in clients:
+            client.receive()
+            if not client.player.writer.transport.buffered:
+                for remote, engine in zip(client.boards, match.engines):
+                    assert_same(remote, engine)
+    assert received == [True, True]
+    assert clients[0].winner == clients[1].winner
+    assert server.matches_played == 1
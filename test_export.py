@@ -0,0 +1,55 @@
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from ai import AutoPlayer
+from engine import Engine, Statistics
+from export import RawWriter, export
+from replay import Replay, ReplayRecorder, STEP_INPUTS, apply_input
+
+SIZE = (320, 240)
+STEP_MS = 5
+
+def record_game(duration=30000, keyframe_interval=2000):
+    """Партия бота с ключевыми кадрами каждые keyframe_interval мс и непустой статистикой игрока"""
+    statistics = Statistics()
+    statistics.games_played = 12
+    statistics.best_score = 150  # Рекорд обновится по ходу партии
+    statistics.achievements['first_line']['achieved'] = True
+    engine = Engine(statistics, seed=7, width=16, height=30)
+    recorder = ReplayRecorder(engine.seed, STEP_MS, keyframe_interval, 16, 30, statistics=statistics)
+    player = AutoPlayer(lookahead=False)
+    while engine.elapsed < duration and not engine.game_over:
+        for action in player.act(engine):
+            apply_input(engine, STEP_INPUTS[action])
+            recorder.record(engine.elapsed, STEP_INPUTS[action])
+        engine.tick(STEP_MS)
+        recorder.keyframe(engine)
+    recorder.finish(engine.elapsed)
+    return bytes(recorder.data)
+
+def export_raw(data, path, chunk_frames):
+    export(data, RawWriter(str(path)), SIZE, fps=5, image_format='raw', workers=1,
+           chunk_frames=chunk_frames)
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_keyframe_keeps_statistics():
+    data = record_game()
+    replay = Replay(data)
+    assert len(replay.keyframes) > 3
+    end = replay.play()
+    for time_ms in (replay.keyframe_times[2] + 10, replay.duration):
+        assert replay.seek(time_ms).statistics.__dict__ == replay.play(time_ms).statistics.__dict__
+    assert end.statistics.best_score > 150
+
+def test_frames_do_not_depend_on_chunking(tmp_path):
+    data = record_game()
+    small = export_raw(data, tmp_path / 'small.rgb', 3)
+    whole = export_raw(data, tmp_path / 'whole.rgb', 500)
+    frame = SIZE[0] * SIZE[1] * 3
+    assert len(small) == len(whole) and len(small) % frame == 0
+    differing = [i for i in range(len(small) // frame)
+                 if small[i * frame:(i + 1) * frame] != whole[i * frame:(i + 1) * frame]]
+    assert differing == []
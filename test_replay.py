@@ -0,0 +1,143 @@
+import copy
+import random
+
+import pytest
+
+from ai import AutoPlayer
+from engine import Engine, Statistics, LEFT, RIGHT, DOWN
+from replay import (MAGIC, VERSION, LEGACY_REPEAT_MS, RESET, STEP_INPUTS, PRESS_LEFT, PRESS_RIGHT,
+                    PRESS_DOWN, RELEASE_LEFT, RELEASE_RIGHT, RELEASE_DOWN, Replay, ReplayRecorder,
+                    apply_input, write_varint, encode_piece, encode_row, encode_statistics, encode_state)
+
+STEP_MS = 10
+DURATION = 60000
+KEYFRAME_INTERVAL = 4000
+HELD_INPUTS = [PRESS_LEFT, PRESS_RIGHT, PRESS_DOWN, RELEASE_LEFT, RELEASE_RIGHT, RELEASE_DOWN]
+
+def encode_version_state(engine, version):
+    """Состояние ключевого кадра в формате версии version"""
+    buffer = bytearray()
+    for value in (engine.score, engine.level, engine.lines_cleared_total, engine.fall_time,
+                  engine.fall_speed, int(engine.game_over), engine.pieces_drawn):
+        write_varint(buffer, value)
+    for action in engine.held:
+        write_varint(buffer, int(engine.held[action]))
+        move_time = engine.move_time[action]
+        write_varint(buffer, move_time if version >= 4 else LEGACY_REPEAT_MS - move_time)
+    encode_piece(buffer, engine.current_piece)
+    encode_piece(buffer, engine.next_piece)
+    board = engine.board
+    top = board.top if version >= 6 else 0
+    if version >= 6:
+        write_varint(buffer, top)
+    for i in range(top, board.height):
+        encode_row(buffer, board.row(i), board.row_colors(i))
+    if version >= 5:
+        encode_statistics(buffer, engine.statistics)
+    return bytes(buffer)
+
+class VersionRecorder(ReplayRecorder):
+    """ReplayRecorder, который пишет заголовок и состояния в формате старой версии"""
+    def __init__(self, version, engine, keyframe_interval):
+        super().__init__(engine.seed, STEP_MS, keyframe_interval, engine.width, engine.height)
+        self.version = version
+        self.data = bytearray(MAGIC)
+        self.data.append(version)
+        write_varint(self.data, engine.seed)
+        write_varint(self.data, STEP_MS)
+        if version >= 2:
+            write_varint(self.data, engine.width)
+            write_varint(self.data, engine.height)
+        if version >= 4:
+            write_varint(self.data, engine.das)
+            write_varint(self.data, engine.arr)
+        if version >= 5:
+            encode_statistics(self.data, engine.statistics)
+
+    def record_state(self, code, engine):
+        state = encode_version_state(engine, self.version)
+        self.record(engine.elapsed, code)
+        write_varint(self.data, len(state))
+        self.data.extend(state)
+
+def new_engine(version, seed):
+    """Движок с правилами версии: до 4 без DAS/ARR, в версии 1 только обычное поле"""
+    statistics = Statistics()
+    statistics.games_played = 3
+    statistics.best_score = 500
+    width, height = (12, 22) if version == 1 else (10, 16)
+    if version < 4:
+        engine = Engine(statistics, seed=seed, width=width, height=height, rewind_depth=4,
+                        das=LEGACY_REPEAT_MS, arr=LEGACY_REPEAT_MS)
+        engine.soft_drop = LEGACY_REPEAT_MS
+        engine.shift_on_press = False
+    else:
+        engine = Engine(statistics, seed=seed, width=width, height=height, rewind_depth=4)
+    return engine
+
+def engine_state(engine, version):
+    board = engine.board
+    state = (engine.score, engine.level, engine.lines_cleared_total, engine.fall_time, engine.fall_speed,
+             engine.game_over, engine.pieces_drawn, dict(engine.held), dict(engine.move_time),
+             dict(engine.current_piece), dict(engine.next_piece), board.masks(),
+             [board.row_colors(i) for i in range(board.height)], list(board.heights), board.filled)
+    if version >= 5:
+        state += (copy.deepcopy(engine.statistics.__dict__),)
+    return state
+
+def record_game(version, seed):
+    """Партия бота со случайными нажатиями, отменами и сбросами; возвращает запись и состояния
+    живого движка в моменты после событий этого момента"""
+    rnd = random.Random(seed)
+    engine = new_engine(version, seed)
+    if version == VERSION:
+        recorder = ReplayRecorder(engine.seed, STEP_MS, KEYFRAME_INTERVAL, engine.width, engine.height,
+                                  statistics=engine.statistics)
+    else:
+        recorder = VersionRecorder(version, engine, KEYFRAME_INTERVAL)
+    player = AutoPlayer(lookahead=False)
+    states = {}
+    while engine.elapsed < DURATION:
+        codes = [STEP_INPUTS[action] for action in player.act(engine)]
+        if rnd.random() < 0.02:
+            codes.append(rnd.choice(HELD_INPUTS))
+        if engine.game_over and rnd.random() < 0.01:
+            codes.append(RESET)
+        for code in codes:
+            apply_input(engine, code)
+            recorder.record(engine.elapsed, code)
+        if version >= 3 and rnd.random() < 0.002:
+            # Отмена хода или повтор партии: в записи событие RESTORE с состоянием после возврата
+            if rnd.random() < 0.8:
+                engine.rewind()
+            else:
+                engine.retry()
+            recorder.restore(engine)
+        if engine.elapsed % 700 == 0:
+            states[engine.elapsed] = engine_state(engine, version)
+        engine.tick(STEP_MS)
+        recorder.keyframe(engine)
+    recorder.finish(engine.elapsed)
+    states[engine.elapsed] = engine_state(engine, version)
+    return bytes(recorder.data), states
+
+def test_current_state_encoding():
+    engine = new_engine(VERSION, 1)
+    for action in AutoPlayer(lookahead=False).act(engine):
+        engine.step(action)
+    engine.tick(engine.fall_speed)
+    assert encode_version_state(engine, VERSION) == encode_state(engine)
+
+@pytest.mark.parametrize('version', range(1, VERSION + 1))
+def test_round_trip(version):
+    data, states = record_game(version, seed=version)
+    replay = Replay(data)
+    assert replay.version == version
+    assert (replay.width, replay.height) == (new_engine(version, 0).width, new_engine(version, 0).height)
+    assert len(replay.keyframes) >= DURATION // KEYFRAME_INTERVAL - 1
+    assert engine_state(replay.play(), version) == states[replay.duration]
+    for time_ms, state in states.items():
+        assert engine_state(replay.seek(time_ms), version) == state, time_ms
+    times = sorted(states)
+    for time_ms, engine in zip(times, replay.states(times)):
+        assert engine_state(engine, version) == states[time_ms], time_ms
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from storage import StatsStore, LOG_NAME, RECORD, DAY_SECONDS
+
+NOW = 1700000000.0
+
+def fill(store, scores, player='alice', when=NOW):
+    for i, score in enumerate(scores):
+        store.record(player, score, lines=i, level=1 + i % 3, seed=i, when=when)
+
+def test_reopen_keeps_index(tmp_path):
+    with StatsStore(tmp_path) as store:
+        fill(store, [100, 300, 200])
+        store.record('bob', 250, 4, 2, when=NOW)
+    with StatsStore(tmp_path) as store:
+        assert [record['score'] for record in store.top(3)] == [300, 250, 200]
+        assert store.totals()['games'] == 4
+        assert store.totals()['score'] == 850
+        assert store.player_best('alice')['best'] == 300
+        assert store.player_best('alice')['games'] == 3
+        assert store.player_best('carol') is None
+        assert store.rolling_totals(1, now=NOW)['games'] == 4
+
+def test_top_ties_keep_earlier_game_first(tmp_path):
+    with StatsStore(tmp_path) as store:
+        fill(store, [500, 500, 500])
+        assert [record['number'] for record in store.top(3)] == [0, 1, 2]
+
+def test_player_table_grows(tmp_path):
+    with StatsStore(tmp_path, player_capacity=4) as store:
+        for i in range(10):
+            store.record(f'p{i}', i * 10, 1, 1, when=NOW)
+        assert store.header['player_capacity'] > 4
+        assert all(store.player_best(f'p{i}')['best'] == i * 10 for i in range(10))
+
+def test_player_capacity_rounds_to_power_of_two(tmp_path):
+    with StatsStore(tmp_path, player_capacity=5) as store:
+        assert store.header['player_capacity'] == 8
+        for i in range(20):
+            store.record(f'p{i}', i, 1, 1, when=NOW)
+        assert all(store.player_best(f'p{i}')['best'] == i for i in range(20))
+
+def test_torn_record_is_dropped(tmp_path):
+    with StatsStore(tmp_path) as store:
+        fill(store, [100, 200])
+    with open(os.path.join(tmp_path, LOG_NAME), 'ab') as f:
+        f.write(b'\x01' * (RECORD.size // 2))
+    with StatsStore(tmp_path) as store:
+        assert store.count == 2
+        assert store.totals()['games'] == 2
+
+def test_recovery_after_crash_before_header(tmp_path):
+    """Падение после обновления таблиц в mmap, но до записи заголовка: запись учитывается один раз"""
+    with StatsStore(tmp_path) as store:
+        fill(store, [100, 999, 300, 50, 200])
+
+        def crash():
+            raise SystemExit
+        store.write_header = crash
+        with pytest.raises(SystemExit):
+            store.record('alice', 999, 7, 4, when=NOW)
+        store.index.flush()  # Страницы mmap остаются в кэше ОС и после падения процесса
+
+    with StatsStore(tmp_path) as store:
+        assert store.count == 6
+        assert store.totals()['games'] == 6
+        assert store.totals()['score'] == 2648
+        assert store.player_best('alice')['games'] == 6
+        assert [record['score'] for record in store.top(3)] == [999, 999, 300]
+        assert [record['number'] for record in store.top(2)] == [1, 5]
+        assert store.rolling_totals(1, now=NOW)['games'] == 6
+
+def test_compact_keeps_best_and_totals(tmp_path):
+    with StatsStore(tmp_path, top_capacity=2) as store:
+        fill(store, [100, 900, 300], when=NOW - 40 * DAY_SECONDS)
+        store.record('bob', 50, 1, 1, when=NOW - 40 * DAY_SECONDS)
+        store.record('bob', 70, 1, 1, when=NOW)
+        assert store.compact(now=NOW) == 2
+    with StatsStore(tmp_path) as store:
+        assert store.count == 3
+        assert store.totals()['games'] == 5
+        assert [record['score'] for record in store.top(2)] == [900, 300]
+        assert store.player_best('bob')['best'] == 70
+        assert store.player_best('bob')['games'] == 2
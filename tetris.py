@@ -1,47 +1,159 @@
+from profiling import FrameProfiler, LatencyMeter, StartupTimer
+startup = StartupTimer()  # Создается до остальных импортов, чтобы учесть и их время
+
 import pygame
-import random
+import argparse
+import json
 import math
+import os
+from collections import OrderedDict, deque
 
-# Инициализация Pygame
-pygame.init()
+from engine import (GRID_WIDTH, GRID_HEIGHT, MIN_WIDTH, MIN_HEIGHT, REWIND_DEPTH, DAS_MS, ARR_MS, COLORS,
+                    GREEN, Engine, Statistics, piece_state)
+from ai import AutoPlayer
+from storage import StatsStore
+from broadcast import Broadcaster, FileSink, SocketSink
+from replay import (ReplayRecorder, apply_input, STEP_INPUTS, PRESS_LEFT, PRESS_RIGHT, PRESS_DOWN,
+                    RELEASE_LEFT, RELEASE_RIGHT, RELEASE_DOWN, STEP_ROTATE, STEP_DROP, RESET)
 
-# Получаем размер экрана
-infoObject = pygame.display.Info()
-SCREEN_WIDTH = infoObject.current_w
-SCREEN_HEIGHT = infoObject.current_h
+startup.mark('imports')
 
 # Константы
 BLOCK_SIZE = 30  # Размер одного блока
-GRID_WIDTH = 12  # Ширина игрового поля в блоках
-GRID_HEIGHT = 22  # Высота игрового поля в блоках
-
-# Вычисляем отступ слева для центрирования игрового поля
-GRID_LEFT_MARGIN = (SCREEN_WIDTH - (GRID_WIDTH * BLOCK_SIZE + 300)) // 2  # 300px для интерфейса справа
+MIN_BLOCK_SIZE = 4  # Меньше блок не ужимается, даже если широкое поле не влезает в экран
+INTERFACE_WIDTH = 300  # Место справа от поля под секции меню
+FPS = 60  # Ограничение частоты кадров
+IDLE_FPS = 15  # Частота кадров, пока игра стоит (меню после проигрыша)
+SIM_STEP_MS = 5  # Шаг симуляции; задержки падения и повтора движения кратны ему
+MAX_FRAME_MS = 250  # Больше этого за кадр не догоняем (после зависания или перетаскивания окна)
+PROFILER_OVERLAY_POS = (10, 10)  # Левый верхний угол оверлея производительности (F3)
+FONT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'tetris', 'fonts.json')
+
+# Клавиши управления фигурой: события ввода при нажатии и отпускании
+PRESS_KEYS = {
+    pygame.K_LEFT: PRESS_LEFT,
+    pygame.K_RIGHT: PRESS_RIGHT,
+    pygame.K_DOWN: PRESS_DOWN,
+    pygame.K_UP: STEP_ROTATE,
+    pygame.K_SPACE: STEP_DROP,
+}
+RELEASE_KEYS = {
+    pygame.K_LEFT: RELEASE_LEFT,
+    pygame.K_RIGHT: RELEASE_RIGHT,
+    pygame.K_DOWN: RELEASE_DOWN,
+}
+
+def grid_left_margin(screen_width, width=GRID_WIDTH, block_size=BLOCK_SIZE):
+    """Отступ слева для центрирования игрового поля"""
+    return (screen_width - (width * block_size + INTERFACE_WIDTH)) // 2
+
+def fit_block_size(screen_width, width, block_size=BLOCK_SIZE):
+    """Размер блока, при котором поле шириной width помещается на экран рядом с меню"""
+    return max(MIN_BLOCK_SIZE, min(block_size, (screen_width - INTERFACE_WIDTH) // width))
 
 # Цвета
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
 GRAY = (128, 128, 128)
-CYAN = (0, 240, 240)  # Более яркий циан
-YELLOW = (240, 240, 0)  # Более яркий желтый
-MAGENTA = (240, 0, 240)  # Более яркая пурпурная
-RED = (240, 0, 0)  # Более яркий красный
-GREEN = (0, 240, 0)  # Более яркий зеленый
-BLUE = (0, 0, 240)  # Более яркий синий
-ORANGE = (240, 160, 0)  # Более яркий оранжевый
-
-COLORS = [CYAN, YELLOW, MAGENTA, RED, GREEN, BLUE, ORANGE]
-
-# Фигуры тетрамино
-SHAPES = [
-    [[1, 1, 1, 1]],  # I
-    [[1, 1], [1, 1]],  # O
-    [[1, 1, 1], [0, 1, 0]],  # T
-    [[1, 1, 1], [1, 0, 0]],  # L
-    [[1, 1, 1], [0, 0, 1]],  # J
-    [[1, 1, 0], [0, 1, 1]],  # S
-    [[0, 1, 1], [1, 1, 0]]   # Z
-]
+
+class SurfaceCache:
+    """Общий LRU-кэш отрисованных поверхностей: текст, кнопки, подложки секций, кадры заголовка"""
+    def __init__(self, capacity=512, max_pixels=None):
+        self.capacity = capacity  # Максимум поверхностей в кэше
+        self.max_pixels = max_pixels  # Необязательный лимит суммарной площади поверхностей
+        self.surfaces = OrderedDict()
+        self.pixels = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, render):
+        """Поверхность по ключу; при промахе создается вызовом render()"""
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = render()
+        self.surfaces[key] = surface
+        self.pixels += surface.get_width() * surface.get_height()
+        self.evict()
+        return surface
+
+    def evict(self):
+        # Вытесняем давно не использованные поверхности, самую свежую оставляем всегда
+        while len(self.surfaces) > 1 and (
+                len(self.surfaces) > self.capacity or
+                (self.max_pixels is not None and self.pixels > self.max_pixels)):
+            _, surface = self.surfaces.popitem(last=False)
+            self.pixels -= surface.get_width() * surface.get_height()
+            self.evictions += 1
+
+    def text(self, font, text, color):
+        """Отрисованный текст, ключ — шрифт, строка и цвет"""
+        return self.get(('text', font, font.get_height(), text, color),
+                        lambda: font.render(text, True, color))
+
+    def clear(self):
+        self.surfaces.clear()
+        self.pixels = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+surface_cache = SurfaceCache()
+
+class FontCache:
+    """Шрифты по (имя, размер); путь к системному шрифту ищется один раз и сохраняется на диск"""
+    def __init__(self, path=None):
+        self.path = path
+        self.paths = None  # Имя -> путь к файлу шрифта или None, если шрифта в системе нет
+        self.fonts = {}
+
+    def load_paths(self):
+        self.paths = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self.paths = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def save_paths(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.paths, f)
+        except OSError:
+            pass  # Без кэша просто будем искать шрифт при каждом запуске
+
+    def resolve(self, name):
+        """Путь к файлу шрифта name: из кэша или перебором системных шрифтов (медленно)"""
+        if self.paths is None:
+            self.load_paths()
+        if name in self.paths:
+            path = self.paths[name]
+            if path is None or os.path.exists(path):
+                return path
+        path = self.paths[name] = pygame.font.match_font(name)
+        self.save_paths()
+        return path
+
+    def get(self, name, size):
+        """Шрифт как у SysFont; name=None — встроенный шрифт pygame"""
+        font = self.fonts.get((name, size))
+        if font is None:
+            path = self.resolve(name) if name else None
+            font = self.fonts[name, size] = pygame.font.Font(path, size)
+        return font
+
+fonts = FontCache(FONT_CACHE_PATH)
 
 class Button:
     def __init__(self, x, y, width, height, text, color, hover_color):
@@ -50,16 +162,23 @@ class Button:
         self.color = color
         self.hover_color = hover_color
         self.is_hovered = False
-        self.font = pygame.font.SysFont('Arial', 14)
+
+    def render(self, color):
+        surface = pygame.Surface(self.rect.size)
+        rect = surface.get_rect()
+        pygame.draw.rect(surface, color, rect)
+        pygame.draw.rect(surface, WHITE, rect, 2)
+        
+        text_surface = surface_cache.text(fonts.get('Arial', 14), self.text, WHITE)
+        text_rect = text_surface.get_rect(center=rect.center)
+        surface.blit(text_surface, text_rect)
+        return surface
 
     def draw(self, screen):
         color = self.hover_color if self.is_hovered else self.color
-        pygame.draw.rect(screen, color, self.rect)
-        pygame.draw.rect(screen, WHITE, self.rect, 2)
-        
-        text_surface = self.font.render(self.text, True, WHITE)
-        text_rect = text_surface.get_rect(center=self.rect.center)
-        screen.blit(text_surface, text_rect)
+        surface = surface_cache.get(('button', self.rect.size, self.text, color),
+                                    lambda: self.render(color))
+        screen.blit(surface, self.rect)
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEMOTION:
@@ -86,336 +205,540 @@ class Animation:
             return 1.0
         return progress
 
-class Statistics:
-    def __init__(self):
-        self.total_lines = 0
-        self.total_score = 0
-        self.max_level = 1
-        self.games_played = 0
-        self.best_score = 0
-        self.achievements = {
-            'first_line': {'name': 'Первая линия', 'achieved': False},
-            'level_5': {'name': 'Уровень 5', 'achieved': False},
-            'score_1000': {'name': 'Счет 1000', 'achieved': False},
-            'score_5000': {'name': 'Счет 5000', 'achieved': False},
-            'lines_50': {'name': '50 линий', 'achieved': False}
-        }
+class BlockAtlas:
+    """Атлас заранее отрисованных блоков: по спрайту на каждый цвет и его тень"""
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.blocks = {}
+        self.shadows = {}
+
+    def build(self, colors):
+        # Заполняем атлас заранее, чтобы в игровом цикле не было аллокаций
+        for color in colors:
+            self.block(color)
+            self.shadow(color)
+
+    def block(self, color):
+        sprite = self.blocks.get(color)
+        if sprite is None:
+            sprite = self.blocks[color] = self.render_block(color)
+        return sprite
+
+    def shadow(self, color):
+        sprite = self.shadows.get(color)
+        if sprite is None:
+            sprite = self.shadows[color] = self.render_shadow(color)
+        return sprite
+
+    def render_block(self, color):
+        """Блок с эффектом объема и свечения, собранный в один спрайт"""
+        size = self.block_size
+        sprite = pygame.Surface((size, size))
 
-    def update(self, lines, score, level):
-        self.total_lines += lines
-        self.total_score += score
-        self.max_level = max(self.max_level, level)
-        self.best_score = max(self.best_score, score)
-        
-        # Проверка достижений
-        if lines > 0 and not self.achievements['first_line']['achieved']:
-            self.achievements['first_line']['achieved'] = True
-        if level >= 5 and not self.achievements['level_5']['achieved']:
-            self.achievements['level_5']['achieved'] = True
-        if score >= 1000 and not self.achievements['score_1000']['achieved']:
-            self.achievements['score_1000']['achieved'] = True
-        if score >= 5000 and not self.achievements['score_5000']['achieved']:
-            self.achievements['score_5000']['achieved'] = True
-        if self.total_lines >= 50 and not self.achievements['lines_50']['achieved']:
-            self.achievements['lines_50']['achieved'] = True
+        # Основной блок
+        pygame.draw.rect(sprite, color, (0, 0, size - 1, size - 1))
+
+        # Эффект свечения
+        glow_surface = pygame.Surface((size, size), pygame.SRCALPHA)
+        glow_surface.fill((*color, 30))
+        sprite.blit(glow_surface, (0, 0))
+
+        # Светлая грань (сверху и слева)
+        light_color = (min(color[0] + 50, 255),
+                      min(color[1] + 50, 255),
+                      min(color[2] + 50, 255))
+        pygame.draw.line(sprite, light_color, (0, 0), (size - 1, 0))
+        pygame.draw.line(sprite, light_color, (0, 0), (0, size - 1))
+
+        # Темная грань (снизу и справа)
+        dark_color = (max(color[0] - 50, 0),
+                     max(color[1] - 50, 0),
+                     max(color[2] - 50, 0))
+        pygame.draw.line(sprite, dark_color, (size - 1, 0), (size - 1, size - 1))
+        pygame.draw.line(sprite, dark_color, (0, size - 1), (size - 1, size - 1))
+        return sprite.convert()
+
+    def render_shadow(self, color):
+        """Тень фигуры: затемненный блок без граней"""
+        sprite = pygame.Surface((self.block_size - 1, self.block_size - 1))
+        sprite.fill((color[0]//3, color[1]//3, color[2]//3))
+        return sprite.convert()
+
+
+def engine_attribute(name):
+    """Свойство интерфейса, которое читает и пишет одноименный атрибут движка"""
+    return property(lambda self: getattr(self.engine, name),
+                    lambda self, value: setattr(self.engine, name, value))
 
 class Tetris:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.FULLSCREEN)
+    def __init__(self, fps=FPS, vsync=False, seed=None, record=False, profile_path=None,
+                 screen_size=None, store=None, player='player', broadcaster=None,
+                 board_size=(GRID_WIDTH, GRID_HEIGHT), offscreen=False, das=DAS_MS, arr=ARR_MS,
+                 practice=False):
+        self.fps = fps
+        self.screen = None
+        self.offscreen = offscreen  # Кадры рисуются в память, а не в окно (export.py)
+        # Только нужные подсистемы: без звука, джойстиков и прочего из pygame.init()
+        pygame.display.init()
+        pygame.font.init()
+        startup.mark('pygame init')
+
+        # Без screen_size игра идет на весь экран, иначе в окне заданного размера
+        flags = pygame.FULLSCREEN if screen_size is None else 0
+        if screen_size is None:
+            info = pygame.display.Info()
+            screen_size = (info.current_w, info.current_h)
+        screen_width, screen_height = screen_size
+        if vsync:
+            # Вертикальная синхронизация в SDL доступна только с масштабируемым окном
+            try:
+                self.screen = pygame.display.set_mode((screen_width, screen_height),
+                                                      flags | pygame.SCALED, vsync=1)
+            except pygame.error:
+                pass
+        if offscreen:
+            # Окно не нужно, но convert() спрайтов атласа требует установленного режима экрана
+            pygame.display.set_mode((1, 1))
+            self.screen = pygame.Surface(screen_size)
+        if self.screen is None:
+            self.screen = pygame.display.set_mode((screen_width, screen_height), flags)
+        # Большое поле рисуется меньшими блоками и видно через окно из view_rows строк
+        board_width, board_height = board_size
+        self.block_size = fit_block_size(screen_width, board_width)
+        self.view_rows = min(board_height, screen_height // self.block_size)
+        self.view_top = 0  # Верхняя видимая строка поля
+        self.grid_left = grid_left_margin(screen_width, board_width, self.block_size)
         pygame.display.set_caption('Тетрис')
         self.clock = pygame.time.Clock()
-        self.statistics = Statistics()
+        startup.mark('display')
+
+        self.font = fonts.get('Comic Sans MS', 36)
+        self.small_font = fonts.get('Comic Sans MS', 24)
+        self.profiler_font = fonts.get(None, 20)
+        startup.mark('fonts')
+
+        # Сохраненные партии (storage.py): итоги и рекорд переживают перезапуск
+        self.store = store
+        self.player = player
+        # Тренировка: Backspace отменяет последние фигуры, R начинает партию заново с теми же фигурами.
+        # Такие партии не в зачет: статистика отдельная и не сохраняется, рекорд не пишется
+        self.practice = practice
+        if practice:
+            statistics = Statistics()
+        else:
+            statistics = store.statistics() if store else None
+        self.engine = Engine(statistics, seed=seed, width=board_width, height=board_height,
+                             rewind_depth=REWIND_DEPTH if practice else 0, das=das, arr=arr)
+        self.broadcaster = broadcaster  # Трансляция для зрителей (см. broadcast.py)
+        # Запись ввода для воспроизведения партии (см. replay.py)
+        self.recorder = ReplayRecorder(self.engine.seed, SIM_STEP_MS, width=board_width, height=board_height,
+                                       das=das, arr=arr, statistics=self.statistics) if record else None
+        # Ввод с метками времени: события, пришедшие во время ожидания кадра, и очередь
+        # действий (время, обработчик, аргументы), которые симуляция применит в свой момент
+        self.arrived = []
+        self.pending = deque()
+        self.latency = LatencyMeter()  # От события клавиши до показа кадра с его результатом
         self.animations = {
             'line_clear': Animation(500),  # 500ms для анимации очистки линии
             'piece_lock': Animation(200),  # 200ms для анимации фиксации фигуры
         }
-        self.buttons = {
-            'restart': Button(SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 + 100, 200, 50, 
-                            "Начать заново", (50, 50, 60), (70, 70, 80)),
-            'exit': Button(SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 + 160, 200, 50,
-                          "Выход", (50, 50, 60), (70, 70, 80))
-        }
-        self.grid = [[0 for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-        self.current_piece = self.new_piece()
-        self.next_piece = self.new_piece()
-        self.game_over = False
-        self.score = 0
-        self.level = 1
-        self.lines_cleared_total = 0
-        try:
-            self.font = pygame.font.SysFont('Comic Sans MS', 36)
-            self.small_font = pygame.font.SysFont('Comic Sans MS', 24)
-        except:
-            self.font = pygame.font.Font(None, 36)
-            self.small_font = pygame.font.Font(None, 24)
-        self.move_left = False
-        self.move_right = False
-        self.move_down = False
-        self.move_delay = 100
-        self.move_time_left = 0
-        self.move_time_right = 0
-        self.move_time_down = 0
+        # Кнопки, секции меню и атлас блоков строятся при первой отрисовке игры (layout)
+        self.buttons = {}
+        self.panels = {}
         self.show_statistics = False
         self.lines_to_clear = []  # Список линий для анимации очистки
+        self.autoplay = False  # Фигуры ставит бот (клавиша A)
+        self.autoplayer = AutoPlayer()
+        self.background = None  # Кэшированный фон, пересоздается при смене разрешения
+        self.atlas = BlockAtlas(self.block_size)
+        self.static_layer = None  # Фон, сетка и подложки секций одним слоем
+        self.last_frame = None  # Состояние последнего кадра для поиска изменений
+        self.profiler = FrameProfiler()
+        self.profile_path = profile_path  # Куда выгружать замеры (F4 и при выходе)
+        self.show_profiler = False  # Оверлей производительности (F3)
+        self.profiler_surface = None
+        self.profiler_updated = 0
+        startup.mark('game state')
+
+    # Состояние партии живет в движке, интерфейс только читает его
+    board = engine_attribute('board')
+    current_piece = engine_attribute('current_piece')
+    next_piece = engine_attribute('next_piece')
+    game_over = engine_attribute('game_over')
+    score = engine_attribute('score')
+    level = engine_attribute('level')
+    lines_cleared_total = engine_attribute('lines_cleared_total')
+    statistics = engine_attribute('statistics')
 
     def new_piece(self):
-        # Создание новой фигуры
-        shape = random.choice(SHAPES)
-        color = random.choice(COLORS)
-        return {
-            'shape': shape,
-            'color': color,
-            'x': GRID_WIDTH // 2 - len(shape[0]) // 2,
-            'y': 0
-        }
+        return self.engine.new_piece()
 
     def valid_move(self, piece, x, y):
-        # Проверка возможности движения
-        for i in range(len(piece['shape'])):
-            for j in range(len(piece['shape'][0])):
-                if piece['shape'][i][j]:
-                    new_x = x + j
-                    new_y = y + i
-                    if new_x < 0 or new_x >= GRID_WIDTH or new_y >= GRID_HEIGHT:
-                        return False
-                    if new_y >= 0 and self.grid[new_y][new_x]:
-                        return False
-        return True
+        return self.engine.valid_move(piece, x, y)
 
     def merge_piece(self):
-        # Добавление фигуры в сетку
-        for i in range(len(self.current_piece['shape'])):
-            for j in range(len(self.current_piece['shape'][0])):
-                if self.current_piece['shape'][i][j]:
-                    self.grid[self.current_piece['y'] + i][self.current_piece['x'] + j] = self.current_piece['color']
+        self.engine.merge_piece()
 
     def remove_complete_lines(self):
-        lines_cleared = 0
-        i = GRID_HEIGHT - 1
-        
-        # Находим и удаляем заполненные линии
-        while i >= 0:
-            if all(self.grid[i]):
-                # Удаляем заполненную линию
-                del self.grid[i]
-                # Добавляем новую пустую линию сверху
-                self.grid.insert(0, [0 for _ in range(GRID_WIDTH)])
-                lines_cleared += 1
-            else:
-                i -= 1
-        
-        if lines_cleared > 0:
-            self.statistics.update(lines_cleared, self.score, self.level)
-        
-        return lines_cleared
+        return self.engine.remove_complete_lines()
 
     def rotate_piece(self):
-        # Поворот фигуры
-        shape = self.current_piece['shape']
-        rotated = list(zip(*shape[::-1]))
-        if self.valid_move({'shape': rotated, 'x': self.current_piece['x'], 'y': self.current_piece['y']},
-                          self.current_piece['x'], self.current_piece['y']):
-            self.current_piece['shape'] = rotated
+        self.engine.rotate_piece()
 
     def reset_game(self):
-        self.grid = [[0 for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-        self.current_piece = self.new_piece()
-        self.next_piece = self.new_piece()
-        self.game_over = False
-        self.score = 0
-        self.level = 1
-        self.lines_cleared_total = 0
+        self.input(RESET)
+
+    def rewind(self):
+        """Отмена последней поставленной фигуры"""
+        if self.engine.rewind() and self.recorder:
+            self.recorder.restore(self.engine)
+
+    def retry(self):
+        """Повтор партии с начала с той же последовательностью фигур"""
+        self.engine.retry()
+        if self.recorder:
+            self.recorder.restore(self.engine)
+
+    def input(self, code):
+        """Событие ввода: применяется к движку и попадает в запись, если она ведется"""
+        apply_input(self.engine, code)
+        if self.recorder:
+            self.recorder.record(self.engine.elapsed, code)
+
+    def input_latency(self):
+        """Задержка ввода до показа кадра по последним событиям: count, p50, p90, p99, mean, max в мс"""
+        return self.latency.summary()
 
     def calculate_level(self):
-        # Повышаем уровень каждые 10 линий
-        self.level = (self.lines_cleared_total // 10) + 1
-        return max(50, 250 - (self.level - 1) * 20)  # Уменьшаем задержку падения с каждым уровнем
+        return self.engine.calculate_level()
 
     def drop_piece(self):
-        # Мгновенный сброс фигуры вниз
-        drop_distance = 0
-        while self.valid_move(self.current_piece, self.current_piece['x'], self.current_piece['y'] + 1):
-            self.current_piece['y'] += 1
-            drop_distance += 1
-        return drop_distance
+        return self.engine.drop_piece()
+
+    def landing_y(self, piece):
+        return self.engine.landing_y(piece)
 
     def draw_shadow(self, piece, color):
         """Отрисовка тени для падающей фигуры"""
-        shadow_y = piece['y']
         # Находим позицию, где фигура остановится
-        while self.valid_move(piece, piece['x'], shadow_y + 1):
-            shadow_y += 1
+        shadow_y = self.landing_y(piece)
         
-        # Рисуем полупрозрачную тень
-        for i in range(len(piece['shape'])):
-            for j in range(len(piece['shape'][0])):
-                if piece['shape'][i][j]:
-                    shadow_color = (color[0]//3, color[1]//3, color[2]//3)
-                    pygame.draw.rect(self.screen, shadow_color,
-                                   (GRID_LEFT_MARGIN + (piece['x'] + j) * BLOCK_SIZE,
-                                    (shadow_y + i) * BLOCK_SIZE,
-                                    BLOCK_SIZE - 1, BLOCK_SIZE - 1))
+        # Рисуем тень одним пакетом из атласа
+        sprite = self.atlas.shadow(color)
+        self.screen.blits(self.shape_sprites(piece_state(piece).cells, sprite,
+                                             self.grid_left + piece['x'] * self.block_size,
+                                             (shadow_y - self.view_top) * self.block_size), False)
+
+    def shape_sprites(self, cells, sprite, left, top):
+        """Пары (спрайт, позиция) для всех клеток фигуры, готовые для blits()"""
+        size = self.block_size
+        return [(sprite, (left + j * size, top + i * size)) for i, j in cells]
 
     def draw_block(self, x, y, color):
         """Отрисовка блока с эффектом объема и свечения"""
-        # Основной блок
-        pygame.draw.rect(self.screen, color,
-                        (x, y, BLOCK_SIZE - 1, BLOCK_SIZE - 1))
-        
-        # Эффект свечения
-        glow_surface = pygame.Surface((BLOCK_SIZE * 2, BLOCK_SIZE * 2), pygame.SRCALPHA)
-        pygame.draw.rect(glow_surface, (*color, 30),
-                        (BLOCK_SIZE//2, BLOCK_SIZE//2, BLOCK_SIZE, BLOCK_SIZE))
-        self.screen.blit(glow_surface, (x - BLOCK_SIZE//2, y - BLOCK_SIZE//2))
-        
-        # Светлая грань (сверху и слева)
-        light_color = (min(color[0] + 50, 255),
-                      min(color[1] + 50, 255),
-                      min(color[2] + 50, 255))
-        pygame.draw.line(self.screen, light_color,
-                        (x, y), (x + BLOCK_SIZE - 1, y))
-        pygame.draw.line(self.screen, light_color,
-                        (x, y), (x, y + BLOCK_SIZE - 1))
-        
-        # Темная грань (снизу и справа)
-        dark_color = (max(color[0] - 50, 0),
-                     max(color[1] - 50, 0),
-                     max(color[2] - 50, 0))
-        pygame.draw.line(self.screen, dark_color,
-                        (x + BLOCK_SIZE - 1, y),
-                        (x + BLOCK_SIZE - 1, y + BLOCK_SIZE - 1))
-        pygame.draw.line(self.screen, dark_color,
-                        (x, y + BLOCK_SIZE - 1),
-                        (x + BLOCK_SIZE - 1, y + BLOCK_SIZE - 1))
+        self.screen.blit(self.atlas.block(color), (x, y))
 
-    def draw_background(self):
-        """Улучшенный фон с градиентом и узором"""
-        # Создаем градиентный фон
-        for i in range(SCREEN_HEIGHT):
+    def render_background(self, size):
+        """Однократная отрисовка градиентного фона на отдельную поверхность"""
+        width, height = size
+        background = pygame.Surface(size)
+        for i in range(height):
             # Вычисляем значения цветовых компонентов
-            blue = int((i / SCREEN_HEIGHT) * 40)
+            blue = int((i / height) * 40)
             color = (0, 0, blue + 10)
-            pygame.draw.line(self.screen, color, (0, i), (SCREEN_WIDTH, i))
+            pygame.draw.line(background, color, (0, i), (width, i))
+        return background.convert()
 
-    def draw(self):
-        self.draw_background()  # Рисуем фон
-        
-        # Отрисовка бокового меню
-        interface_x = GRID_LEFT_MARGIN + GRID_WIDTH * BLOCK_SIZE + 40
+    def draw_background(self):
+        """Улучшенный фон с градиентом и узором"""
+        # Градиент рисуется один раз на разрешение, дальше это один blit
+        size = self.screen.get_size()
+        if self.background is None or self.background.get_size() != size:
+            self.background = self.render_background(size)
+        self.screen.blit(self.background, (0, 0))
+
+    def layout(self):
+        """Отложенная часть запуска: кнопки, секции меню и атлас блоков"""
+        with startup.measure('layout'):
+            screen_width, screen_height = self.screen.get_size()
+            self.buttons = {
+                'restart': Button(screen_width // 2 - 100, screen_height // 2 + 100, 200, 50, 
+                                "Начать заново", (50, 50, 60), (70, 70, 80)),
+                'exit': Button(screen_width // 2 - 100, screen_height // 2 + 160, 200, 50,
+                              "Выход", (50, 50, 60), (70, 70, 80))
+            }
+            self.panels = self.layout_panels()
+            self.atlas.build(COLORS)
+
+    def layout_panels(self):
+        """Положение и заголовки секций бокового меню"""
+        interface_x = self.grid_left + self.board.width * self.block_size + 40
         menu_width = 260
-
-        def draw_section(y, height, title=None):
-            s = pygame.Surface((menu_width, height))
-            s.fill((30, 30, 40))
-            s.set_alpha(200)
-            self.screen.blit(s, (interface_x, y))
-            
-            # Добавляем градиентную рамку
-            gradient_colors = [(50, 50, 60), (70, 70, 80)]
-            for i, color in enumerate(gradient_colors):
-                pygame.draw.rect(self.screen, color,
-                               (interface_x - i, y - i,
-                                menu_width + i * 2, height + i * 2), 1)
-            
-            if title:
-                # Добавляем подчеркивание для заголовка
-                title_text = self.font.render(title, True, WHITE)
-                self.screen.blit(title_text, (interface_x + 10, y + 10))
-                pygame.draw.line(self.screen, WHITE,
-                               (interface_x + 10, y + 45),
-                               (interface_x + menu_width - 10, y + 45))
-                return y + 50
-            return y
-
-        # Отрисовка границ игрового поля
-        pygame.draw.rect(self.screen, (50, 50, 60),
-                        (GRID_LEFT_MARGIN - 2, 0,
-                         GRID_WIDTH * BLOCK_SIZE + 4,
-                         GRID_HEIGHT * BLOCK_SIZE + 2), 2)
-
-        # Отрисовка сетки и блоков
-        for i in range(GRID_HEIGHT):
-            for j in range(GRID_WIDTH):
-                # Отрисовка сетки более тонкими линиями
-                pygame.draw.rect(self.screen, (40, 40, 50),
-                               (GRID_LEFT_MARGIN + j * BLOCK_SIZE,
-                                i * BLOCK_SIZE,
-                                BLOCK_SIZE, BLOCK_SIZE), 1)
-                if self.grid[i][j]:
-                    self.draw_block(GRID_LEFT_MARGIN + j * BLOCK_SIZE,
-                                  i * BLOCK_SIZE,
-                                  self.grid[i][j])
-
-        # Отрисовка текущей фигуры с плавным движением
-        if self.current_piece:
-            # Отрисовка тени
-            self.draw_shadow(self.current_piece, self.current_piece['color'])
-            
-            for i in range(len(self.current_piece['shape'])):
-                for j in range(len(self.current_piece['shape'][0])):
-                    if self.current_piece['shape'][i][j]:
-                        # Плавное движение фигуры
-                        target_x = GRID_LEFT_MARGIN + (self.current_piece['x'] + j) * BLOCK_SIZE
-                        target_y = (self.current_piece['y'] + i) * BLOCK_SIZE
-                        self.draw_block(target_x, target_y, self.current_piece['color'])
-
-        # Секция статистики
         stats_y = 20
         stats_height = 180
-        content_y = draw_section(stats_y, stats_height, "Статистика")
-        
-        stats_texts = [
-            f'Счет: {self.score}',
-            f'Уровень: {self.level}',
-            f'Линий: {self.lines_cleared_total}',
-            f'Рекорд: {self.statistics.best_score}'
-        ]
-        
-        for i, text in enumerate(stats_texts):
-            text_surface = self.font.render(text, True, WHITE)
-            self.screen.blit(text_surface, (interface_x + 10, content_y + i * 30))
-
-        # Секция следующей фигуры
         next_y = stats_y + stats_height + 40  # Увеличен отступ между секциями
         next_height = 140
-        content_y = draw_section(next_y, next_height, "Следующая фигура")
-        
-        # Центрируем следующую фигуру
-        next_shape = self.next_piece['shape']
-        shape_width = len(next_shape[0]) * BLOCK_SIZE
-        shape_height = len(next_shape) * BLOCK_SIZE
-        next_x = interface_x + (menu_width - shape_width) // 2
-        next_piece_y = content_y + (next_height - shape_height - 50) // 2
-        
-        for i in range(len(next_shape)):
-            for j in range(len(next_shape[0])):
-                if next_shape[i][j]:
-                    self.draw_block(
-                        next_x + j * BLOCK_SIZE,
-                        next_piece_y + i * BLOCK_SIZE,
-                        self.next_piece['color']
-                    )
-
-        # Секция достижений
         achievements_y = next_y + next_height + 40  # Увеличен отступ между секциями
         achievements_height = 200
-        content_y = draw_section(achievements_y, achievements_height, "Достижения")
+        return {
+            'stats': (pygame.Rect(interface_x, stats_y, menu_width, stats_height), "Статистика"),
+            'next': (pygame.Rect(interface_x, next_y, menu_width, next_height), "Следующая фигура"),
+            'achievements': (pygame.Rect(interface_x, achievements_y, menu_width, achievements_height),
+                             "Достижения"),
+        }
+
+    def render_section(self, size):
+        s = pygame.Surface(size)
+        s.fill((30, 30, 40))
+        s.set_alpha(200)
+        return s
+
+    def draw_section(self, surface, rect, title=None):
+        s = surface_cache.get(('section', rect.size), lambda: self.render_section(rect.size))
+        surface.blit(s, rect.topleft)
+        
+        # Добавляем градиентную рамку
+        gradient_colors = [(50, 50, 60), (70, 70, 80)]
+        for i, color in enumerate(gradient_colors):
+            pygame.draw.rect(surface, color, rect.inflate(i * 2, i * 2), 1)
         
-        for i, (key, achievement) in enumerate(self.statistics.achievements.items()):
-            color = GREEN if achievement['achieved'] else GRAY
-            text = f"✓ {achievement['name']}" if achievement['achieved'] else f"□ {achievement['name']}"
-            text_surface = self.small_font.render(text, True, color)
-            self.screen.blit(text_surface, (interface_x + 10, content_y + i * 30))
+        if title:
+            # Добавляем подчеркивание для заголовка
+            title_text = surface_cache.text(self.font, title, WHITE)
+            surface.blit(title_text, (rect.x + 10, rect.y + 10))
+            pygame.draw.line(surface, WHITE,
+                           (rect.x + 10, rect.y + 45),
+                           (rect.right - 10, rect.y + 45))
+
+    def build_static_layer(self, size):
+        """Неизменная часть кадра: фон, рамка и сетка поля, подложки секций меню"""
+        if self.background is None or self.background.get_size() != size:
+            self.background = self.render_background(size)
+        layer = self.background.copy()
+
+        # Отрисовка границ видимой части игрового поля
+        size = self.block_size
+        pygame.draw.rect(layer, (50, 50, 60),
+                        (self.grid_left - 2, 0,
+                         self.board.width * size + 4,
+                         self.view_rows * size + 2), 2)
+
+        # Отрисовка сетки более тонкими линиями
+        for i in range(self.view_rows):
+            for j in range(self.board.width):
+                pygame.draw.rect(layer, (40, 40, 50),
+                               (self.grid_left + j * size,
+                                i * size,
+                                size, size), 1)
+
+        for rect, title in self.panels.values():
+            self.draw_section(layer, rect, title)
+        return layer
+
+    def frame_state(self):
+        """Все, что видно в кадре: спрайты клеток поля, клетки тени и фигуры, содержимое секций и меню.
+
+        Клетки берутся только из видимых строк, ключ — (строка в окне, столбец)"""
+        block = self.atlas.block
+        top = self.scroll_view()
+        bottom = top + self.view_rows
+        cells = {(i - top, j): block(color)
+                 for i, _, row in self.board.stored_rows(top, bottom)
+                 for j, color in enumerate(row) if color}
+
+        shadow_cells = set()
+        piece_cells = set()
+        piece = self.current_piece
+        if piece:
+            # Тень под фигурой, сама фигура рисуется поверх нее
+            shadow_y = self.landing_y(piece)
+            shadow = self.atlas.shadow(piece['color'])
+            shape = piece_state(piece).cells
+            for i, j in shape:
+                if top <= shadow_y + i < bottom:
+                    shadow_cells.add((shadow_y + i - top, piece['x'] + j))
+            sprite = block(piece['color'])
+            for i, j in shape:
+                if top <= piece['y'] + i < bottom:
+                    piece_cells.add((piece['y'] + i - top, piece['x'] + j))
+            shadow_cells -= piece_cells
+            cells.update(dict.fromkeys(shadow_cells, shadow))
+            cells.update(dict.fromkeys(piece_cells, sprite))
+
+        panels = {
+            'stats': (
+                f'Счет: {self.score}',
+                f'Уровень: {self.level}',
+                f'Линий: {self.lines_cleared_total}',
+                f'Рекорд: {self.statistics.best_score}'
+            ),
+            'next': (piece_state(self.next_piece), self.next_piece['color']),
+            'achievements': tuple((achievement['name'], achievement['achieved'])
+                                  for achievement in self.statistics.achievements.values()),
+        }
 
-        # Отрисовка кнопок в игровом меню
-        if self.game_over:
-            for button in self.buttons.values():
-                button.draw(self.screen)
+        overlay = (self.game_over, tuple(button.is_hovered for button in self.buttons.values()),
+                   self.show_profiler, top)
+        return cells, (shadow_cells, piece_cells), panels, overlay
+
+    def scroll_view(self):
+        """Верхняя видимая строка: высокое поле листается по пол-окна вслед за падающей фигурой.
+
+        Окно зависит только от положения фигуры, поэтому любой кадр партии можно нарисовать
+        без предыдущих (export.py). При сдвиге поле перерисовывается целиком, но не на каждой строке."""
+        limit = self.board.height - self.view_rows
+        piece = self.current_piece
+        if limit > 0 and piece:
+            half = max(1, self.view_rows // 2)
+            self.view_top = min(limit, piece['y'] // half * half)
+        return self.view_top
+
+    def draw_panel(self, name, value):
+        """Перерисовка содержимого секции поверх ее подложки, возвращает обновленную область"""
+        rect = self.panels[name][0]
+        area = rect.inflate(4, 4)
+        self.screen.blit(self.static_layer, area, area)
+        self.screen.set_clip(area)
+        content_x = rect.x + 10
+        content_y = rect.y + 50
+
+        if name == 'stats':
+            for i, text in enumerate(value):
+                text_surface = surface_cache.text(self.font, text, WHITE)
+                self.screen.blit(text_surface, (content_x, content_y + i * 30))
+
+        elif name == 'next':
+            # Центрируем следующую фигуру
+            next_state, color = value
+            shape_width = next_state.width * self.block_size
+            shape_height = next_state.height * self.block_size
+            next_x = rect.x + (rect.width - shape_width) // 2
+            next_piece_y = content_y + (rect.height - shape_height - 50) // 2
+            self.screen.blits(self.shape_sprites(next_state.cells, self.atlas.block(color),
+                                                 next_x, next_piece_y), False)
+
+        elif name == 'achievements':
+            for i, (achievement_name, achieved) in enumerate(value):
+                color = GREEN if achieved else GRAY
+                text = f"✓ {achievement_name}" if achieved else f"□ {achievement_name}"
+                text_surface = surface_cache.text(self.small_font, text, color)
+                self.screen.blit(text_surface, (content_x, content_y + i * 30))
+
+        self.screen.set_clip(None)
+        return area
+
+    def render_profiler_overlay(self):
+        """Текст оверлея: FPS, время кадра, число отрисовок и перцентили фаз"""
+        profiler = self.profiler
+        lines = [
+            f'FPS: {self.clock.get_fps():.1f}',
+            f"Кадр p50/p99: {profiler.percentile('frame', 50):.2f} / {profiler.percentile('frame', 99):.2f} мс",
+            f"Блитов: {profiler.percentile('#blits', 50):.0f}, областей: {profiler.percentile('#rects', 50):.0f}",
+            f'Ввод до кадра p50/p99: {self.latency.percentile(50):.0f} / {self.latency.percentile(99):.0f} мс',
+        ]
+        for phase in profiler.phases:
+            lines.append(f'{phase}: {profiler.percentile(phase, 50):.2f} / {profiler.percentile(phase, 99):.2f}')
+
+        surface = pygame.Surface((260, 10 + 18 * len(lines)))
+        surface.fill((20, 20, 30))
+        pygame.draw.rect(surface, (70, 70, 80), surface.get_rect(), 1)
+        for i, text in enumerate(lines):
+            surface.blit(self.profiler_font.render(text, True, WHITE), (8, 6 + i * 18))
+        return surface
+
+    def draw_profiler_overlay(self):
+        """Оверлей производительности поверх кадра, возвращает его область"""
+        now = pygame.time.get_ticks()
+        if self.profiler_surface is None or now - self.profiler_updated >= 500:
+            self.profiler_surface = self.render_profiler_overlay()
+            self.profiler_updated = now
+        return self.screen.blit(self.profiler_surface, PROFILER_OVERLAY_POS)
 
-        pygame.display.flip()
+    def draw(self):
+        """Инкрементальная отрисовка: обновляются только изменившиеся клетки и секции"""
+        if not self.panels:
+            self.layout()
+        cells, (shadow_cells, piece_cells), panels, overlay = self.frame_state()
+        self.profiler.mark('state')
+
+        size = self.screen.get_size()
+        if self.static_layer is None or self.static_layer.get_size() != size:
+            self.static_layer = self.build_static_layer(size)
+            self.last_frame = None
+
+        last_frame = self.last_frame
+        self.last_frame = (cells, panels, overlay)
+
+        if last_frame is None or last_frame[2] != overlay:
+            # Полная перерисовка: первый кадр, смена разрешения, показ или скрытие меню, прокрутка поля
+            self.screen.blit(self.static_layer, (0, 0))
+            self.profiler.mark('background')
+            size = self.block_size
+            # Поле, тень и фигура отдельными проходами: у каждой фазы свое время в профиле
+            for phase, keys in (('grid', cells.keys() - shadow_cells - piece_cells),
+                                ('shadow', shadow_cells), ('piece', piece_cells)):
+                self.screen.blits([(cells[i, j], (self.grid_left + j * size, i * size))
+                                   for i, j in keys], False)
+                self.profiler.mark(phase)
+            self.profiler.count('blits', len(cells) + 1)
+            for name, value in panels.items():
+                self.draw_panel(name, value)
+            self.profiler.mark('panels')
+
+            # Отрисовка кнопок в игровом меню
+            if self.game_over:
+                for button in self.buttons.values():
+                    button.draw(self.screen)
+            if self.show_profiler:
+                self.draw_profiler_overlay()
+            self.profiler.mark('overlay')
+
+            if not self.offscreen:
+                pygame.display.flip()
+            self.profiler.count('rects')
+            self.profiler.mark('flip')
+            return
+
+        last_cells, last_panels, _ = last_frame
+        dirty = []
+        size = self.block_size
+
+        # Клетки, в которых сменился спрайт: восстанавливаем подложку и рисуем новый.
+        # Освободившиеся клетки относятся к полю, остальные — к слою своего нового спрайта
+        changed = {key for key in last_cells.keys() | cells.keys()
+                   if cells.get(key) is not last_cells.get(key)}
+        for phase, keys in (('grid', changed - shadow_cells - piece_cells),
+                            ('shadow', changed & shadow_cells), ('piece', changed & piece_cells)):
+            for i, j in keys:
+                rect = pygame.Rect(self.grid_left + j * size, i * size, size, size)
+                self.screen.blit(self.static_layer, rect, rect)
+                sprite = cells.get((i, j))
+                if sprite is not None:
+                    self.screen.blit(sprite, rect)
+                dirty.append(rect)
+            self.profiler.mark(phase)
+        self.profiler.count('blits', len(dirty))
+
+        for name, value in panels.items():
+            if value != last_panels[name]:
+                dirty.append(self.draw_panel(name, value))
+        self.profiler.mark('panels')
+
+        if self.show_profiler:
+            dirty.append(self.draw_profiler_overlay())
+        self.profiler.mark('overlay')
+
+        if dirty and not self.offscreen:
+            pygame.display.update(dirty)
+        self.profiler.count('rects', len(dirty))
+        self.profiler.mark('flip')
 
     def handle_events(self):
-        for event in pygame.event.get():
+        """Разбор событий: служебные клавиши сразу, управление фигурой — в очередь с временем события"""
+        now = pygame.time.get_ticks()
+        events = self.arrived + [(now, event) for event in pygame.event.get()]
+        self.arrived = []
+        for timestamp, event in events:
             if event.type == pygame.QUIT:
                 return False
             
@@ -431,56 +754,86 @@ class Tetris:
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     return False
-                if not self.game_over:
-                    if event.key == pygame.K_LEFT:
-                        self.move_left = True
-                    elif event.key == pygame.K_RIGHT:
-                        self.move_right = True
-                    elif event.key == pygame.K_DOWN:
-                        self.move_down = True
-                    elif event.key == pygame.K_UP:
-                        self.rotate_piece()
-                    elif event.key == pygame.K_SPACE:
-                        drop_distance = self.drop_piece()
-                        self.score += drop_distance * 2
+                if event.key == pygame.K_a:
+                    self.autoplay = not self.autoplay
+                if event.key == pygame.K_F3:
+                    self.show_profiler = not self.show_profiler
+                if event.key == pygame.K_F4:
+                    self.profiler.export(self.profile_path or 'profile.csv')
+                # Отмена и повтор тоже в очереди, чтобы не обогнать движения, нажатые раньше
+                if self.practice and event.key == pygame.K_BACKSPACE:
+                    self.pending.append((timestamp, self.rewind, ()))
+                if self.practice and event.key == pygame.K_r:
+                    self.pending.append((timestamp, self.retry, ()))
+                if not self.game_over and event.key in PRESS_KEYS:
+                    self.pending.append((timestamp, self.input, (PRESS_KEYS[event.key],)))
             
             elif event.type == pygame.KEYUP:
-                if event.key == pygame.K_LEFT:
-                    self.move_left = False
-                elif event.key == pygame.K_RIGHT:
-                    self.move_right = False
-                elif event.key == pygame.K_DOWN:
-                    self.move_down = False
+                if event.key in RELEASE_KEYS:
+                    self.pending.append((timestamp, self.input, (RELEASE_KEYS[event.key],)))
         
         return True
 
+    def apply_inputs(self, until):
+        """Применение действий из очереди, пришедших раньше момента until (мс, время pygame)"""
+        pending = self.pending
+        while pending and pending[0][0] < until:
+            timestamp, handler, args = pending.popleft()
+            handler(*args)
+            self.latency.applied(timestamp)
+
+    def wait_frame(self, deadline):
+        """Ожидание следующего кадра до deadline. События принимаются по мере прихода и получают
+        точное время; после нажатия или отпускания клавиши кадр начинается сразу"""
+        while True:
+            remaining = deadline - pygame.time.get_ticks()
+            if remaining <= 0:
+                return
+            event = pygame.event.wait(math.ceil(remaining))
+            if event.type == pygame.NOEVENT:
+                return
+            self.arrived.append((pygame.time.get_ticks(), event))
+            if event.type in (pygame.KEYDOWN, pygame.KEYUP):
+                return
+
     def show_start_screen(self):
         """Улучшенный стартовый экран с анимацией и инструкциями"""
         self.screen.fill(BLACK)
         
         # Анимированный заголовок
-        title_font = pygame.font.SysFont('Comic Sans MS', 72)
-        title_surface = title_font.render('ТЕТРИС', True, WHITE)
-        title_rect = title_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 3))
+        title_font = fonts.get('Comic Sans MS', 72)
+        title_surface = surface_cache.text(title_font, 'ТЕТРИС', WHITE)
+
+        # Кольцо заранее масштабированных кадров на один период пульсации |sin|
+        title_frames = []
+        for step in range(round(math.pi / 0.02)):
+            scale = 1 + 0.05 * abs(math.sin(step * 0.02))
+            size = (int(title_surface.get_width() * scale),
+                    int(title_surface.get_height() * scale))
+            title_frames.append(surface_cache.get(
+                ('title', title_font, 'ТЕТРИС', size),
+                lambda: pygame.transform.scale(title_surface, size)))
         
         # Инструкции
         instructions = [
             'ЛЕВО, ПРАВО : Перемещение фигуры',
             'ВВЕРХ : Поворот фигуры',
             'ВНИЗ : Ускорение падения',
-            'Пробел : Мгновенное падение'
+            'Пробел : Мгновенное падение',
+            'A : Автоигра'
         ]
         
-        instruction_font = pygame.font.SysFont('Comic Sans MS', 24)
+        instruction_font = fonts.get('Comic Sans MS', 24)
         instruction_surfaces = []
         for text in instructions:
-            surf = instruction_font.render(text, True, GRAY)
+            surf = surface_cache.text(instruction_font, text, GRAY)
             instruction_surfaces.append(surf)
         
         # Кнопка начала игры
+        screen_width, screen_height = self.screen.get_size()
         start_button = Button(
-            SCREEN_WIDTH // 2 - 150,
-            SCREEN_HEIGHT * 2 // 3,
+            screen_width // 2 - 150,
+            screen_height * 2 // 3,
             300, 60,
             'НАЧАТЬ ИГРУ',
             (50, 50, 60),
@@ -488,7 +841,7 @@ class Tetris:
         )
         
         # Анимационный цикл
-        angle = 0
+        frame = 0
         waiting = True
         clock = pygame.time.Clock()
         
@@ -507,84 +860,124 @@ class Tetris:
             self.draw_background()
             
             # Анимация заголовка
-            scaled_title = pygame.transform.scale(
-                title_surface,
-                (int(title_surface.get_width() * (1 + 0.05 * abs(math.sin(angle)))),
-                 int(title_surface.get_height() * (1 + 0.05 * abs(math.sin(angle)))))
-            )
-            scaled_rect = scaled_title.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 3))
+            scaled_title = title_frames[frame]
+            scaled_rect = scaled_title.get_rect(center=(screen_width // 2, screen_height // 3))
             self.screen.blit(scaled_title, scaled_rect)
             
             # Отрисовка инструкций
             for i, surf in enumerate(instruction_surfaces):
-                pos = (SCREEN_WIDTH // 2 - surf.get_width() // 2,
-                      SCREEN_HEIGHT // 2 + i * 30)
+                pos = (screen_width // 2 - surf.get_width() // 2,
+                      screen_height // 2 + i * 30)
                 self.screen.blit(surf, pos)
             
             # Отрисовка кнопки
             start_button.draw(self.screen)
             
             pygame.display.flip()
-            angle += 0.02
+            startup.finish()
+            frame = (frame + 1) % len(title_frames)
             clock.tick(60)
 
+        # Стартовый экран затер игровое поле, следующий кадр рисуем целиком
+        self.last_frame = None
+
     def run(self):
         self.show_start_screen()  # Показываем экран приветствия
-        fall_time = 0
-        fall_speed = self.calculate_level()
+        
+        # Симуляция идет фиксированными шагами независимо от частоты кадров
+        accumulator = 0
+        last_time = pygame.time.get_ticks()
         
         while True:
+            frame_start = pygame.time.get_ticks()
+            self.profiler.begin_frame()
             if not self.handle_events():
                 return
-
-            if not self.game_over:
-                delta_time = self.clock.get_rawtime()
-                fall_time += delta_time
-                self.clock.tick()
-
-                # Обработка движения
-                if self.move_left:
-                    self.move_time_left += delta_time
-                    if self.move_time_left >= self.move_delay:
-                        if self.valid_move(self.current_piece, self.current_piece['x'] - 1, self.current_piece['y']):
-                            self.current_piece['x'] -= 1
-                        self.move_time_left = 0
-
-                if self.move_right:
-                    self.move_time_right += delta_time
-                    if self.move_time_right >= self.move_delay:
-                        if self.valid_move(self.current_piece, self.current_piece['x'] + 1, self.current_piece['y']):
-                            self.current_piece['x'] += 1
-                        self.move_time_right = 0
-
-                if self.move_down:
-                    self.move_time_down += delta_time
-                    if self.move_time_down >= self.move_delay:
-                        if self.valid_move(self.current_piece, self.current_piece['x'], self.current_piece['y'] + 1):
-                            self.current_piece['y'] += 1
-                        self.move_time_down = 0
-
-                if fall_time >= fall_speed:
-                    if self.valid_move(self.current_piece, self.current_piece['x'], self.current_piece['y'] + 1):
-                        self.current_piece['y'] += 1
-                    else:
-                        self.merge_piece()
-                        lines_cleared = self.remove_complete_lines()
-                        self.lines_cleared_total += lines_cleared
-                        self.score += lines_cleared * 100 * self.level
-                        fall_speed = self.calculate_level()
-                        self.current_piece = self.next_piece
-                        self.next_piece = self.new_piece()
-                        
-                        if not self.valid_move(self.current_piece, self.current_piece['x'], self.current_piece['y']):
-                            self.game_over = True
-                            self.statistics.games_played += 1
-                    
-                    fall_time = 0
+            self.profiler.mark('input')
+
+            now = pygame.time.get_ticks()
+            accumulator = min(accumulator + now - last_time, MAX_FRAME_MS)
+            last_time = now
+
+            while accumulator >= SIM_STEP_MS:
+                # Ввод применяется перед шагом, на который пришлось время события
+                self.apply_inputs(now - accumulator + SIM_STEP_MS)
+                accumulator -= SIM_STEP_MS
+                if self.game_over:
+                    continue
+
+                # Бот планирует ход один раз для каждой новой фигуры
+                if self.autoplay:
+                    for action in self.autoplayer.act(self.engine):
+                        self.input(STEP_INPUTS[action])
+
+                # Движение, гравитация, фиксация фигур и очки считает движок
+                self.engine.tick(SIM_STEP_MS)
+                if self.game_over and self.store and not self.practice:
+                    self.store.record_game(self.player, self.engine)
+            # События из неполного остатка шага не ждут следующего кадра
+            self.apply_inputs(now + 1)
+
+            if self.recorder:
+                self.recorder.keyframe(self.engine)
+            if self.broadcaster:
+                self.broadcaster.publish(self.engine)
+            self.profiler.mark('simulation')
 
             self.draw()
+            self.latency.presented(pygame.time.get_ticks())
+            self.profiler.end_frame()
+
+            # Ждем до следующего кадра, принимая ввод; clock.tick здесь только считает FPS
+            self.clock.tick()
+            self.wait_frame(frame_start + 1000 / (IDLE_FPS if self.game_over else self.fps))
 
 if __name__ == '__main__':
-    game = Tetris()
+    parser = argparse.ArgumentParser(description='Тетрис')
+    parser.add_argument('--seed', type=int, default=None, help='Сид последовательности фигур')
+    parser.add_argument('--record', metavar='FILE', help='Записать партию в файл (см. replay.py)')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='Выгрузить замеры фаз кадра при выходе (.csv или .json)')
+    parser.add_argument('--stats', metavar='DIR', default='stats',
+                        help='Каталог сохраненных партий и рекордов')
+    parser.add_argument('--player', default='player', help='Имя игрока в таблице рекордов')
+    parser.add_argument('--width', type=int, default=GRID_WIDTH, help='Ширина поля в блоках')
+    parser.add_argument('--height', type=int, default=GRID_HEIGHT,
+                        help='Высота поля в блоках; большое поле прокручивается за фигурой')
+    parser.add_argument('--das', type=int, default=DAS_MS,
+                        help='Задержка перед автоповтором сдвига при удержании клавиши, мс')
+    parser.add_argument('--arr', type=int, default=ARR_MS, help='Период автоповтора сдвига, мс (0 — сразу до упора)')
+    parser.add_argument('--practice', action='store_true',
+                        help='Тренировка: Backspace отменяет фигуру, R повторяет партию; партии не сохраняются')
+    parser.add_argument('--startup', action='store_true', help='Напечатать время этапов запуска')
+    parser.add_argument('--broadcast-port', type=int, default=None,
+                        help='Транслировать партию зрителям на этот порт (см. broadcast.py)')
+    parser.add_argument('--broadcast-file', metavar='FILE', default=None, help='Транслировать партию в файл')
+    args = parser.parse_args()
+    if args.width < MIN_WIDTH or args.height < MIN_HEIGHT:
+        parser.error(f'поле должно быть не меньше {MIN_WIDTH}x{MIN_HEIGHT}')
+
+    store = StatsStore(args.stats)
+    startup.mark('stats')
+    sinks = []
+    if args.broadcast_port:
+        sinks.append(SocketSink(port=args.broadcast_port))
+    if args.broadcast_file:
+        sinks.append(FileSink(args.broadcast_file))
+    broadcaster = Broadcaster(sinks, args.width, args.height) if sinks else None
+    game = Tetris(seed=args.seed, record=bool(args.record), profile_path=args.profile,
+                  store=store, player=args.player, broadcaster=broadcaster,
+                  board_size=(args.width, args.height), das=args.das, arr=args.arr,
+                  practice=args.practice)
     game.run()
+    store.close()
+    if broadcaster:
+        broadcaster.close()
+    if args.startup:
+        print(startup.report())
+    if args.profile:
+        game.profiler.export(args.profile)
+    if game.recorder:
+        game.recorder.finish(game.engine.elapsed)
+        game.recorder.save(args.record)
     pygame.quit() 
\ No newline at end of file